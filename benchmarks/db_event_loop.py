@@ -0,0 +1,85 @@
+"""Event-loop latency under concurrent database load.
+
+Compares the old blocking pymongo-style calls against the async Database
+layer, using in-process fake collections with a fixed round-trip latency.
+
+    python -m benchmarks.db_event_loop --users 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from database import Database
+
+
+class _SyncCollection:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def find_one(self, query):
+        time.sleep(self.latency)
+        return {"chat_id": query["chat_id"], "verified": True}
+
+
+class _AsyncCollection:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def find_one(self, query):
+        await asyncio.sleep(self.latency)
+        return {"chat_id": query["chat_id"], "verified": True}
+
+
+class _FakeDb:
+    def __init__(self, collection):
+        self.users = collection
+
+
+async def _probe_lag(stop, samples, interval=0.005):
+    """Measure how late the loop wakes a timer while handlers run"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+async def _run(users, lookup):
+    samples, stop = [], asyncio.Event()
+    probe = asyncio.create_task(_probe_lag(stop, samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(lookup(chat_id) for chat_id in range(users)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    samples.sort()
+    return {
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(samples) if samples else 0.0,
+        "lag_max_ms": samples[-1] if samples else 0.0,
+    }
+
+
+async def main(users, latency):
+    sync_users = _SyncCollection(latency)
+
+    async def blocking_lookup(chat_id):
+        return sync_users.find_one({"chat_id": chat_id})
+
+    Database.use(_FakeDb(_AsyncCollection(latency)))
+
+    for name, lookup in (("blocking", blocking_lookup), ("async", Database.get_user)):
+        result = await _run(users, lookup)
+        print(
+            f"{name:>8}: {users} lookups in {result['elapsed_s']:.3f}s, "
+            f"loop lag p50={result['lag_p50_ms']:.1f}ms max={result['lag_max_ms']:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake Mongo round-trip in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.latency))
@@ -0,0 +1,279 @@
+"""Offline load test for the bot's message handlers.
+
+Feeds synthetic Update objects straight into handle_text, handle_image and
+handle_websearch while Telegram, Gemini, Serper and Mongo are replaced by
+local stubs with configurable latency and failure rates. Nothing leaves the
+process, so the numbers can gate performance regressions.
+
+    python -m benchmarks.handlers_bench --handler all --concurrency 1,8,32 --requests 200
+    python -m benchmarks.handlers_bench --handler text --gemini-latency 0.8 --gemini-fail 0.05
+
+Latencies are lognormal around the given median (--*-latency seconds, shaped
+by --jitter); --*-fail is the probability a stubbed call raises. Jobs the
+handlers enqueue run inline, so a measurement covers the whole request.
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import logging
+import random
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from PIL import Image
+from telegram import Message, Update
+from telegram.error import NetworkError
+
+import bot
+import gemini_helper
+from database import Database
+from jobs import jobs
+from limiter import rate_limiter
+
+
+class Profile:
+    """Latency/failure distribution for one stubbed dependency"""
+
+    def __init__(self, median, fail, jitter):
+        self.median = median
+        self.fail = fail
+        self.jitter = jitter
+
+    def delay(self):
+        return random.lognormvariate(0, self.jitter) * self.median if self.median else 0.0
+
+    def failed(self):
+        return random.random() < self.fail
+
+    async def wait(self, exc=RuntimeError):
+        await asyncio.sleep(self.delay())
+        if self.failed():
+            raise exc("injected failure")
+
+    def block(self):
+        """Blocking variant for code the app runs in executor threads"""
+        time.sleep(self.delay())
+        if self.failed():
+            raise RuntimeError("injected failure")
+
+
+class StubGemini:
+    text_model_name = "stub-text"
+    vision_model_name = "stub-vision"
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def generate_text(self, prompt, model_name=None):
+        self.profile.block()
+        return f"Stub answer about: {prompt[:40]}"
+
+    def stream_text(self, prompt, model_name=None):
+        text = self.generate_text(prompt)
+        for start in range(0, len(text), 16):
+            yield text[start:start + 16]
+
+    def analyze_image(self, image_bytes, prompt="", mime_type="image/jpeg", model_name=None):
+        self.profile.block()
+        return f"Stub description of a {len(image_bytes)} byte {mime_type}"
+
+    def analyze_images(self, images, prompt, model_name=None):
+        self.profile.block()
+        return f"Stub description of {len(images)} images"
+
+
+class StubSearch:
+    def __init__(self, profile):
+        self.profile = profile
+
+    async def search(self, query, gl='in', hl='en', user_id=None):
+        await self.profile.wait()
+        return {"summary": f"Stub summary for {query}", "links": ["https://example.com"]}
+
+
+class StubFile:
+    def __init__(self, data, profile):
+        self.data = data
+        self.profile = profile
+
+    async def download_as_bytearray(self):
+        await self.profile.wait(NetworkError)
+        return bytearray(self.data)
+
+
+class StubBot:
+    """Records outbound Bot API calls instead of sending them"""
+
+    def __init__(self, profile, photo_bytes):
+        self.profile = profile
+        self.photo_bytes = photo_bytes
+        self.calls = 0
+        self._message_ids = itertools.count(10_000)
+
+    def _message(self, chat_id, text):
+        message = Message(
+            next(self._message_ids),
+            datetime.utcnow(),
+            SimpleNamespace(id=chat_id, type="private"),
+            text=text
+        )
+        message.set_bot(self)
+        return message
+
+    async def _call(self):
+        self.calls += 1
+        await self.profile.wait(NetworkError)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call()
+        return self._message(chat_id, text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        await self._call()
+        return True
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        await self._call()
+        return True
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        await self._call()
+        return True
+
+    async def get_file(self, file_id, **kwargs):
+        await self._call()
+        return StubFile(self.photo_bytes, self.profile)
+
+
+def install_stubs(args, stub_bot):
+    gemini_helper._shared_helper = StubGemini(Profile(args.gemini_latency, args.gemini_fail, args.jitter))
+    bot.WebSearch = StubSearch(Profile(args.search_latency, args.search_fail, args.jitter))
+    rate_limiter.limit = float("inf")
+
+    db = Profile(args.db_latency, args.db_fail, args.jitter)
+
+    async def get_user(chat_id):
+        await db.wait()
+        return {"chat_id": chat_id, "verified": True}
+
+    async def write(*args, **kwargs):
+        await db.wait()
+
+    async def read_none(*args, **kwargs):
+        await db.wait()
+        return None
+
+    Database.get_user = staticmethod(get_user)
+    Database.save_message = staticmethod(write)
+    Database.save_image = staticmethod(write)
+    Database.find_image_analysis = staticmethod(read_none)
+    Database.get_context = staticmethod(read_none)
+    Database.push_context_turn = staticmethod(read_none)
+    Database.fold_context = staticmethod(write)
+    Database.complete_job = staticmethod(write)
+    Database.retry_job = staticmethod(write)
+    Database.fail_job = staticmethod(write)
+
+    job_ids = itertools.count(1)
+
+    async def run_inline(kind, chat_id, payload):
+        # Last attempt, so a failure is reported to the chat like a real one
+        now = datetime.utcnow()
+        await jobs._run({
+            "_id": next(job_ids), "kind": kind, "chat_id": chat_id, "payload": payload,
+            "attempts": jobs.max_attempts, "created_at": now, "claimed_at": now
+        })
+
+    jobs.bot = stub_bot
+    jobs.enqueue = run_inline
+
+
+def make_update(stub_bot, update_id, kind):
+    chat_id = 100_000 + update_id
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+    }
+    if kind == "image":
+        message["photo"] = [
+            {"file_id": f"p{update_id}-{w}", "file_unique_id": f"u{update_id}-{w}", "width": w, "height": w * 3 // 4}
+            for w in (90, 320, 800, 1280)
+        ]
+    else:
+        # Unique text so the response cache never short-circuits Gemini
+        message["text"] = f"benchmark question {update_id}"
+    return Update.de_json({"update_id": update_id, "message": message}, stub_bot)
+
+
+HANDLERS = {
+    "text": bot.handle_text,
+    "image": bot.handle_image,
+    "websearch": bot.handle_websearch,
+}
+
+
+async def run_level(kind, concurrency, requests, stub_bot, ids):
+    context = SimpleNamespace(bot=stub_bot)
+    handler = HANDLERS[kind]
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            update = make_update(stub_bot, next(ids), kind)
+            started = time.perf_counter()
+            await handler(update, context)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+        "rate": len(latencies) / elapsed,
+    }
+
+
+async def main(args):
+    image = io.BytesIO()
+    Image.new("RGB", (1280, 960), (120, 160, 200)).save(image, "JPEG")
+    stub_bot = StubBot(Profile(args.telegram_latency, args.telegram_fail, args.jitter), image.getvalue())
+    install_stubs(args, stub_bot)
+
+    ids = itertools.count(1)
+    kinds = list(HANDLERS) if args.handler == "all" else [args.handler]
+    print(f"{'handler':>10} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'msg/s':>9}")
+    for kind in kinds:
+        for concurrency in args.concurrency:
+            result = await run_level(kind, concurrency, args.requests, stub_bot, ids)
+            print(f"{kind:>10} {concurrency:>5} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                  f"{result['p99']:>9.1f} {result['rate']:>9.1f}")
+    print(f"outbound Telegram calls: {stub_bot.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handler", choices=["all", *HANDLERS], default="all")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Updates per handler and concurrency level")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Lognormal sigma for every latency")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Keep the handlers' error logging")
+    for name, latency in (("gemini", 0.3), ("search", 0.4), ("telegram", 0.03), ("db", 0.005)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency)
+        parser.add_argument(f"--{name}-fail", type=float, default=0.0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.CRITICAL)
+    asyncio.run(main(args))
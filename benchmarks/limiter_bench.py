@@ -0,0 +1,51 @@
+"""Rate limiter checks per second with a large tracked-user population.
+
+    python -m benchmarks.limiter_bench --users 100000 --checks 1000000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from limiter import MemoryBackend, RateLimiter
+
+
+def bench_sync(users, checks, limit, window):
+    backend = MemoryBackend(max_tracked=users * 2)
+    now = time.time()
+    for user_id in range(users):
+        backend.allow_sync(user_id, now, window, limit)
+
+    ids = [random.randrange(users) for _ in range(checks)]
+    started = time.perf_counter()
+    for user_id in ids:
+        backend.allow_sync(user_id, time.time(), window, limit)
+    elapsed = time.perf_counter() - started
+    return checks / elapsed, len(backend)
+
+
+async def bench_async(users, checks, limit, window):
+    limiter = RateLimiter(MemoryBackend(max_tracked=users * 2), limit, window)
+    for user_id in range(users):
+        await limiter.check_limit(user_id)
+
+    ids = [random.randrange(users) for _ in range(checks)]
+    started = time.perf_counter()
+    for user_id in ids:
+        await limiter.check_limit(user_id)
+    elapsed = time.perf_counter() - started
+    return checks / elapsed, len(limiter.backend)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--window", type=int, default=60)
+    args = parser.parse_args()
+
+    rate, tracked = bench_sync(args.users, args.checks, args.limit, args.window)
+    print(f"MemoryBackend.allow_sync: {rate:,.0f} checks/s ({tracked:,} users tracked)")
+    rate, tracked = asyncio.run(bench_async(args.users, args.checks, args.limit, args.window))
+    print(f"RateLimiter.check_limit:  {rate:,.0f} checks/s ({tracked:,} users tracked)")
@@ -0,0 +1,114 @@
+"""Cold start cost: import time, pre-warm and first-response latency.
+
+Every run launches a fresh interpreter that imports the bot, optionally runs
+the startup pre-warm, then answers two text updates through handle_text with
+Telegram, Mongo and the Gemini API calls stubbed out (see handlers_bench).
+The Gemini SDK itself is real, so its import lands wherever the startup path
+puts it. Modes:
+
+* lazy    -- no pre-warm; the first request creates the clients
+* prewarm -- startup.prewarm() runs before the first request
+
+    python -m benchmarks.startup_bench --runs 5
+    python -m benchmarks.startup_bench --mode prewarm --runs 10 --gemini-latency 0.3
+
+"launch" is the wall time from starting the interpreter to the first answer.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = ("lazy", "prewarm")
+COLUMNS = ("import", "prewarm", "first", "second", "launch")
+
+
+def child(args):
+    """Runs inside the fresh interpreter; prints one JSON line of timings in seconds"""
+    started = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+
+    import logging
+    from types import SimpleNamespace
+
+    import gemini_helper
+    import startup
+    from benchmarks import handlers_bench
+    from database import Database
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    stub_args = SimpleNamespace(
+        gemini_latency=args.gemini_latency, gemini_fail=0.0, search_latency=0.0, search_fail=0.0,
+        telegram_latency=0.0, telegram_fail=0.0, db_latency=0.0, db_fail=0.0, jitter=0.0
+    )
+    stub_bot = handlers_bench.StubBot(handlers_bench.Profile(0.0, 0.0, 0.0), b"")
+    handlers_bench.install_stubs(stub_args, stub_bot)
+    # Keep the real GeminiHelper (and its SDK import); only the API calls are stubbed
+    gemini_helper._shared_helper = None
+    gemini_helper.GeminiHelper.profile = handlers_bench.Profile(args.gemini_latency, 0.0, 0.0)
+    for name in ("generate_text", "stream_text", "analyze_image", "analyze_images"):
+        setattr(gemini_helper.GeminiHelper, name, getattr(handlers_bench.StubGemini, name))
+
+    async def noop(*args, **kwargs):
+        return []
+
+    Database.ping = staticmethod(noop)
+    Database.ensure_indexes = staticmethod(noop)
+
+    async def answer(update_id):
+        update = handlers_bench.make_update(stub_bot, update_id, "text")
+        began = time.perf_counter()
+        await bot.handle_text(update, SimpleNamespace(bot=stub_bot))
+        return time.perf_counter() - began
+
+    async def run():
+        timings = {"import": imported - started, "prewarm": 0.0}
+        if args.child == "prewarm":
+            began = time.perf_counter()
+            await startup.prewarm()
+            timings["prewarm"] = time.perf_counter() - began
+        timings["first"] = await answer(1)
+        timings["answered_at"] = time.time()
+        timings["second"] = await answer(2)
+        return timings
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def launch(mode, args):
+    env = dict(os.environ, STARTUP_CHECK_GEMINI="false")
+    command = [sys.executable, "-m", "benchmarks.startup_bench", "--child", mode,
+               "--gemini-latency", str(args.gemini_latency)]
+    launched = time.time()
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["launch"] = timings.pop("answered_at") - launched
+    return timings
+
+
+def main(args):
+    modes = MODES if args.mode == "all" else [args.mode]
+    print(f"{'mode':>8} " + " ".join(f"{column + ' ms':>11}" for column in COLUMNS))
+    for mode in modes:
+        runs = [launch(mode, args) for _ in range(args.runs)]
+        medians = [statistics.median(run[column] for run in runs) * 1000 for column in COLUMNS]
+        print(f"{mode:>8} " + " ".join(f"{value:>11.0f}" for value in medians))
+    print(f"medians of {args.runs} runs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["all", *MODES], default="all")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per mode")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="Seconds each stubbed Gemini call takes")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+    else:
+        main(args)
@@ -0,0 +1,161 @@
+"""Storage size and history latency with and without the storage policy.
+
+Loads the same synthetic dataset (default one million messages) into two
+databases on a real MongoDB server:
+
+* raw    -- every message stored as-is, as save_message did originally
+* policy -- long answers compressed (pack_text) and messages older than
+            --archive-days moved into messages_archive buckets
+
+then reports data/storage/index size from collStats and the latency of
+Database.get_chat_history for random chats.
+
+    python -m benchmarks.storage_bench --uri mongodb://localhost:27017 --messages 1000000 --chats 5000
+
+The databases are dropped afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import Config
+from database import INDEXES, Database, pack_text
+
+WORDS = None
+
+
+def make_vocabulary(rng, size=3000):
+    letters = "etaoinshrdlucmfwypvbgkjqxz"
+    weights = [12, 9, 8, 7.5, 7, 6.7, 6.3, 6, 6, 4.3, 4, 2.8, 2.8, 2.4, 2.2, 2.4, 2, 2, 1, 1.5, 2, 0.8, 0.2, 0.1, 0.2, 0.1]
+    return ["".join(rng.choices(letters, weights, k=rng.randint(2, 10))) for _ in range(size)]
+
+
+def make_text(rng, median_chars):
+    """Word salad with a Zipf-like word distribution and lognormal length"""
+    target = int(rng.lognormvariate(0, 0.8) * median_chars)
+    words = []
+    length = 0
+    while length < target:
+        word = WORDS[min(int(rng.paretovariate(1.1)) - 1, len(WORDS) - 1)]
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def make_batch(rng, start, size, chats, now, days):
+    return [
+        {
+            "chat_id": rng.randrange(chats),
+            "user_message": make_text(rng, 80),
+            "bot_response": make_text(rng, 1200),
+            "timestamp": now - timedelta(seconds=rng.uniform(0, days * 86400))
+        }
+        for _ in range(start, start + size)
+    ]
+
+
+async def create_indexes(db):
+    for collection, indexes in INDEXES.items():
+        if collection in ("messages", "messages_archive"):
+            for keys, name in indexes:
+                await db[collection].create_index(keys, name=name)
+
+
+async def load(db, args, packed):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    await create_indexes(db)
+    for start in range(0, args.messages, args.batch):
+        batch = make_batch(rng, start, min(args.batch, args.messages - start), args.chats, now, args.days)
+        if packed:
+            batch = [pack_text(doc, "bot_response") for doc in batch]
+        await db.messages.insert_many(batch, ordered=False)
+    return now
+
+
+async def sizes(db):
+    totals = {"count": 0, "size": 0, "storageSize": 0, "totalIndexSize": 0}
+    for collection in ("messages", "messages_archive"):
+        if collection not in await db.list_collection_names():
+            continue
+        stats = await db.command("collStats", collection)
+        for key in totals:
+            totals[key] += stats.get(key, 0)
+    return totals
+
+
+async def history_latency(db, args):
+    Database.use(db)
+    rng = random.Random(args.seed + 1)
+    chat_ids = [rng.randrange(args.chats) for _ in range(args.queries)]
+    latencies = []
+
+    async def worker(ids):
+        for chat_id in ids:
+            started = time.perf_counter()
+            await Database.get_chat_history(chat_id, limit=10)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(worker(chat_ids[i::args.concurrency]) for i in range(args.concurrency)))
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+async def main(args):
+    global WORDS
+    WORDS = make_vocabulary(random.Random(args.seed))
+    client = AsyncIOMotorClient(args.uri)
+    raw, policy = client[f"{args.db}_raw"], client[f"{args.db}_policy"]
+    for db in (raw, policy):
+        await client.drop_database(db.name)
+
+    print(f"Loading {args.messages:,} messages for {args.chats:,} chats...")
+    started = time.perf_counter()
+    await load(raw, args, packed=False)
+    now = await load(policy, args, packed=True)
+    print(f"  loaded in {time.perf_counter() - started:.0f}s")
+
+    started = time.perf_counter()
+    before = now - timedelta(days=args.archive_days)
+    Database.use(policy)
+    moved = 0
+    while True:
+        batch = await Database.archive_messages(before, args.batch, Config.ARCHIVE_BUCKET_SIZE)
+        moved += batch
+        if batch < args.batch:
+            break
+    print(f"  archived {moved:,} messages in {time.perf_counter() - started:.0f}s")
+
+    print(f"{'variant':>8} {'docs':>10} {'data MB':>9} {'disk MB':>9} {'index MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, db in (("raw", raw), ("policy", policy)):
+        stats = await sizes(db)
+        p50, p95, p99 = await history_latency(db, args)
+        print(
+            f"{name:>8} {stats['count']:>10,} {stats['size'] / 2**20:>9.1f} {stats['storageSize'] / 2**20:>9.1f} "
+            f"{stats['totalIndexSize'] / 2**20:>9.1f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}"
+        )
+
+    if not args.keep:
+        for db in (raw, policy):
+            await client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=Config.MONGODB_URI or "mongodb://localhost:27017")
+    parser.add_argument("--db", default="storage_bench", help="Prefix of the two scratch databases")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365, help="Spread of message timestamps")
+    parser.add_argument("--archive-days", type=int, default=Config.ARCHIVE_AFTER_DAYS or 90)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Leave the scratch databases in place")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,125 @@
+"""Webhook throughput harness: POSTs synthetic Telegram updates.
+
+By default it starts a local webhook server whose "application" is a stub
+that spends --latency seconds per update, so the numbers reflect the
+ingestion and chat-sharding layers rather than Telegram or Gemini. Pass
+--url to load an already running server instead.
+
+    python -m benchmarks.webhook_load --workers 4 --chats 200 --updates 5000
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import multiprocessing
+import time
+
+import aiohttp
+
+import webhook
+from config import Config
+
+
+class StubApplication:
+    """Just enough of telegram.ext.Application for webhook.ChatSequencer"""
+
+    post_init = None
+    post_stop = None
+    post_shutdown = None
+    bot = None
+
+    def __init__(self, latency, done=None):
+        self.latency = latency
+        self.done = done
+
+    async def initialize(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update):
+        await asyncio.sleep(self.latency)
+        if self.done is not None:
+            self.done.put(update.update_id)
+
+
+def synthetic_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": f"question {update_id}",
+        },
+    }
+
+
+async def post_updates(url, chats, updates, concurrency, secret):
+    counter = itertools.count()
+    rejected = 0
+    headers = {webhook.SECRET_HEADER: secret} if secret else {}
+
+    async def client(session):
+        nonlocal rejected
+        while (update_id := next(counter)) < updates:
+            payload = synthetic_update(update_id, 1000 + update_id % chats)
+            async with session.post(url, json=payload, headers=headers) as response:
+                if response.status != 200:
+                    rejected += 1
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        return time.perf_counter() - started, rejected
+
+
+async def run_local(args):
+    done = multiprocessing.get_context("spawn").Queue()
+    factory = functools.partial(StubApplication, args.latency, done)
+    Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT, Config.WEBHOOK_SECRET = "127.0.0.1", args.port, None
+    server = asyncio.create_task(webhook._serve(factory, args.workers, register=False))
+    await asyncio.sleep(2 if args.workers > 1 else 0.2)  # Let workers spawn
+
+    url = f"http://127.0.0.1:{args.port}/{Config.WEBHOOK_PATH}"
+    accepted_s, rejected = await post_updates(url, args.chats, args.updates, args.concurrency, None)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter() - accepted_s
+    for _ in range(args.updates - rejected):
+        await loop.run_in_executor(None, done.get)
+    processed_s = time.perf_counter() - started
+
+    print(f"accepted {args.updates - rejected}/{args.updates} in {accepted_s:.2f}s "
+          f"({(args.updates - rejected) / accepted_s:,.0f} updates/s)")
+    print(f"processed all in {processed_s:.2f}s "
+          f"({(args.updates - rejected) / processed_s:,.0f} updates/s, "
+          f"{args.workers} worker(s), {args.latency * 1000:.0f}ms per update)")
+    server.cancel()
+
+
+async def run_remote(args):
+    elapsed, rejected = await post_updates(args.url, args.chats, args.updates, args.concurrency, args.secret)
+    print(f"accepted {args.updates - rejected}/{args.updates} in {elapsed:.2f}s "
+          f"({(args.updates - rejected) / elapsed:,.0f} updates/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Target a running webhook instead of a local stub server")
+    parser.add_argument("--secret", default=Config.WEBHOOK_SECRET)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.01, help="Stub handler time per update")
+    args = parser.parse_args()
+    asyncio.run(run_remote(args) if args.url else run_local(args))
@@ -1,20 +1,46 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
+from telegram import (
+    Update,
+    ReplyKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardRemove,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    PhotoSize
+)
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     MessageHandler,
+    CallbackQueryHandler,
     filters,
     ConversationHandler,
     CallbackContext
 )
 from telegram.constants import ChatAction
-from config import Config
+from config import Config, ConfigError
 from database import Database
-from gemini_helper import GeminiHelper
+from gemini_helper import get_gemini
+from scheduler import gemini_scheduler, SchedulerBusy
+from resilience import CircuitOpenError
+from model_router import model_router
+from streaming import stream_answer, StreamInterrupted
+from outbound import OutboundLimiter, send_in_chunks
+from jobs import jobs
+from startup import prewarm, readiness
+from response_cache import response_cache
+from context_engine import context_engine
+from image_pipeline import analyze_photo, download_prepared, ALBUM_PROMPT
+from media_group import MediaGroupCollector
 from web_search import WebSearch
 from limiter import rate_limit
+import webhook
+import metrics
+from metrics import instrument, InstrumentedRequest, TIMEOUTS
+from cache import TTLCache
+from bson import ObjectId
 import logging
-from datetime import datetime
+import secrets
+from datetime import datetime, timedelta
 import asyncio
 
 # Configure logging
@@ -27,7 +53,28 @@ logger = logging.getLogger(__name__)
 # Conversation states and constants
 WEBSEARCH_PROMPT = range(1)
 GEMINI_TIMEOUT = 25  # Seconds before timing out
+BUSY_MESSAGE = "🚦 The bot is busy right now. Please try again in a moment."
+DEGRADED_MESSAGE = "🛠 The AI service is having trouble right now. Please try again in a few minutes."
+QUEUE_ERROR_MESSAGE = "⚠️ Temporary service issue. Please try again later."
+HISTORY_PAGE_SIZE = 10
+FIND_PAGE_SIZE = 5
+FIND_MAX_RESULTS = 50
+metrics_runner = None
+EPOCH = datetime(1970, 1, 1)
+# /find results by token, so paging buttons never hit Mongo again
+find_results = TTLCache(maxsize=2000, ttl=1800)
+# Attached to answers so the menu never needs a message of its own
+MAIN_MENU = ReplyKeyboardMarkup(
+    [
+        ["💬 Ask Question", "🖼 Analyze Image"],
+        ["🌐 Web Search", "📚 Chat History"],
+        ["⚙️ Settings"]
+    ],
+    resize_keyboard=True,
+    input_field_placeholder="Select an option..."
+)
 
+@instrument("start")
 async def start(update: Update, context: CallbackContext):
     """Handle /start command and user initialization"""
     try:
@@ -35,9 +82,9 @@ async def start(update: Update, context: CallbackContext):
         chat_id = update.effective_chat.id
         
         # Get or create user
-        db_user = Database.get_user(user.id)
+        db_user = await Database.get_user(user.id)
         if not db_user:
-            Database.create_user({
+            await Database.create_user({
                 "chat_id": user.id,
                 "first_name": user.first_name,
                 "username": user.username,
@@ -45,7 +92,7 @@ async def start(update: Update, context: CallbackContext):
                 "verified": False,
                 "created_at": datetime.utcnow()
             })
-            db_user = Database.get_user(user.id)
+            db_user = await Database.get_user(user.id)
 
         if not db_user.get('verified'):
             await request_contact(update)
@@ -72,20 +119,21 @@ async def request_contact(update: Update):
     except Exception as e:
         logger.error(f"Contact request error: {e}")
 
+@instrument("contact_handler")
 async def contact_handler(update: Update, context: CallbackContext):
     """Handle received contact information"""
     try:
         user = update.effective_user
         phone_number = update.message.contact.phone_number
         
-        Database.update_phone(user.id, phone_number)
+        await Database.update_phone(user.id, phone_number)
         
+        # Swapping in the menu also removes the contact keyboard
         await update.message.reply_text(
             "✅ Verification successful!\n"
             "You can now access all features.",
-            reply_markup=ReplyKeyboardRemove()
+            reply_markup=MAIN_MENU
         )
-        await show_main_menu(update, context)
     except Exception as e:
         logger.error(f"Contact handler error: {e}")
         await update.message.reply_text("⚠️ Verification failed. Please try again.")
@@ -93,32 +141,21 @@ async def contact_handler(update: Update, context: CallbackContext):
 async def show_main_menu(update: Update, context: CallbackContext = None):
     """Display main interactive keyboard"""
     try:
-        menu_options = [
-            ["💬 Ask Question", "🖼 Analyze Image"],
-            ["🌐 Web Search", "📚 Chat History"],
-            ["⚙️ Settings"]
-        ]
-        
-        reply_markup = ReplyKeyboardMarkup(
-            menu_options,
-            resize_keyboard=True,
-            input_field_placeholder="Select an option..."
-        )
-        
         if context:
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
                 text="Main Menu:",
-                reply_markup=reply_markup
+                reply_markup=MAIN_MENU
             )
         else:
             await update.message.reply_text(
                 "Main Menu:",
-                reply_markup=reply_markup
+                reply_markup=MAIN_MENU
             )
     except Exception as e:
         logger.error(f"Menu error: {e}")
 
+@instrument("handle_text")
 @rate_limit
 async def handle_text(update: Update, context: CallbackContext):
     """Handle all text messages with enhanced error handling"""
@@ -126,17 +163,11 @@ async def handle_text(update: Update, context: CallbackContext):
         user_input = update.message.text
         chat_id = update.effective_chat.id
         
-        user = Database.get_user(chat_id)
+        user = await Database.get_user(chat_id)
         if not user or not user.get('verified'):
             await request_contact(update)
             return
 
-        # Show typing indicator
-        await context.bot.send_chat_action(
-            chat_id=chat_id, 
-            action=ChatAction.TYPING
-        )
-
         # Handle menu options
         if user_input == "💬 Ask Question":
             await update.message.reply_text("Type your question:", reply_markup=ReplyKeyboardRemove())
@@ -151,67 +182,243 @@ async def handle_text(update: Update, context: CallbackContext):
             return
             
         elif user_input == "📚 Chat History":
+            # The menu that was just tapped is still on screen
             await show_chat_history(update)
-            await show_main_menu(update, context)
             return
             
         elif user_input == "⚙️ Settings":
             await show_settings(update)
-            await show_main_menu(update, context)
             return
             
         else:
-            try:
-                # Process with timeout
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(
-                        GeminiHelper().generate_text, 
-                        user_input
-                    ),
-                    timeout=GEMINI_TIMEOUT
-                )
-                
-                # Truncate long responses
-                if len(response) > 4096:
-                    response = response[:4000] + "\n... [truncated]"
-                    
-                Database.save_message(chat_id, user_input, response)
-                await update.message.reply_text(
-                    f"🤖 **Response**\n\n{response}",
-                    parse_mode="Markdown"
-                )
-                
-            except asyncio.TimeoutError:
-                logger.error("Gemini response timeout")
-                await update.message.reply_text("⌛ Response timed out. Please try again.")
-            except Exception as e:
-                logger.error(f"Gemini API error: {str(e)}")
-                await update.message.reply_text("⚠️ Error processing request. Please try rephrasing.")
-
-        await show_main_menu(update, context)
+            # Answered by a job worker; the handler returns straight away
+            await jobs.enqueue("text", chat_id, {"text": user_input, "message_id": update.message.message_id})
 
     except Exception as e:
         logger.error(f"Text handler error: {str(e)}")
-        await update.message.reply_text("⚠️ Temporary service issue. Please try again later.")
+        await update.message.reply_text(QUEUE_ERROR_MESSAGE, reply_markup=MAIN_MENU)
+
+@instrument("text_job")
+async def run_text_job(bot, job):
+    """Answer a queued question, streamed or in one reply"""
+    chat_id = job['chat_id']
+    user_input = job['payload']['text']
+    reply_to = job['payload']['message_id']
+    gemini = get_gemini()
+    streamed = False
+    # Recent turns plus the rolling summary, within a fixed token budget
+    prompt = (
+        await context_engine.build_prompt(chat_id, user_input)
+        if Config.CONTEXT_ENABLED else user_input
+    )
+    # The question alone decides the tier; history only adds length
+    route = model_router.route("chat", user_input)
+
+    async def produce():
+        nonlocal streamed
+        if Config.STREAM_RESPONSES:
+            # Edit a placeholder as chunks arrive; the first chunk gets an adaptive timeout
+            streamed = True
+            return await stream_answer(
+                bot,
+                chat_id,
+                prompt,
+                timeout=GEMINI_TIMEOUT,
+                route=route,
+                reply_to=reply_to,
+                reply_markup=MAIN_MENU
+            )
+        # The streamed placeholder doubles as the progress indicator
+        await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+        return await gemini_scheduler.call(route.upstream, chat_id, gemini.generate_text, prompt, route.model)
+
+    try:
+        # Cache hits and coalesced duplicates skip the upstream call
+        response = await asyncio.wait_for(
+            response_cache.get_or_generate(prompt, route.model, produce),
+            timeout=None if Config.STREAM_RESPONSES else GEMINI_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        TIMEOUTS.labels("gemini_text").inc()
+        raise
+    except StreamInterrupted as e:
+        if not streamed:
+            # Joined another chat's stream: nothing was posted here, so a retry is safe
+            raise e.__cause__
+        raise
+
+    if not streamed:
+        await send_in_chunks(
+            bot,
+            chat_id,
+            f"🤖 **Response**\n\n{response}",
+            reply_to=reply_to,
+            reply_markup=MAIN_MENU,
+            parse_mode="Markdown"
+        )
+    await Database.save_message(chat_id, user_input, response)
+
+    if Config.CONTEXT_ENABLED:
+        context_engine.record_turn(chat_id, user_input, response)
+
+async def notify_job_failure(bot, job, error):
+    """Tell the user a queued request gave up after its last attempt"""
+    if isinstance(error, StreamInterrupted):
+        # Part of the answer is already in the chat; explain why it stopped
+        error = error.__cause__
+    if isinstance(error, SchedulerBusy):
+        text = BUSY_MESSAGE
+    elif isinstance(error, CircuitOpenError):
+        text = DEGRADED_MESSAGE
+    elif isinstance(error, asyncio.TimeoutError):
+        text = "⌛ Response timed out. Please try again."
+    else:
+        text = "⚠️ Error processing request. Please try again."
+    await bot.send_message(
+        chat_id=job['chat_id'],
+        text=text,
+        reply_to_message_id=job['payload']['message_id'],
+        allow_sending_without_reply=True,
+        reply_markup=MAIN_MENU
+    )
+
+def encode_history_cursor(direction, msg):
+    """Pack a (timestamp, _id) keyset cursor into callback data"""
+    millis = (msg['timestamp'] - EPOCH) // timedelta(milliseconds=1)
+    return f"hist:{direction}:{millis}:{msg['_id']}"
+
+def decode_history_cursor(data):
+    _, direction, millis, object_id = data.split(":")
+    return direction, (EPOCH + timedelta(milliseconds=int(millis)), ObjectId(object_id))
+
+def render_history_page(page):
+    """Format a history page and its older/newer navigation buttons"""
+    response = "📚 Chat History:\n\n"
+    for msg in page['items']:
+        response += f"🕒 {msg['timestamp']:%Y-%m-%d %H:%M}\n"
+        response += f"You: {msg['user_message']}\n"
+        response += f"Bot: {msg['bot_response'][:50]}...\n\n"
+
+    buttons = []
+    if page['has_older']:
+        buttons.append(InlineKeyboardButton("⬅️ Older", callback_data=encode_history_cursor("o", page['items'][-1])))
+    if page['has_newer']:
+        buttons.append(InlineKeyboardButton("Newer ➡️", callback_data=encode_history_cursor("n", page['items'][0])))
+    return response, InlineKeyboardMarkup([buttons]) if buttons else None
 
 async def show_chat_history(update: Update):
-    """Show chat history"""
+    """Show the newest page of chat history"""
     try:
-        history = Database.get_chat_history(update.effective_chat.id)
-        if not history:
+        page = await Database.get_chat_history_page(update.effective_chat.id, limit=HISTORY_PAGE_SIZE)
+        if not page['items']:
             await update.message.reply_text("📚 No chat history found")
             return
 
-        response = "📚 Last 10 Conversations:\n\n"
-        for idx, msg in enumerate(history, 1):
-            response += f"{idx}. You: {msg['user_message']}\n"
-            response += f"   Bot: {msg['bot_response'][:50]}...\n\n"
-        
-        await update.message.reply_text(response)
+        response, reply_markup = render_history_page(page)
+        await update.message.reply_text(response, reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"History error: {e}")
         await update.message.reply_text("⚠️ Error retrieving history")
 
+@instrument("history_page_callback")
+async def history_page_callback(update: Update, context: CallbackContext):
+    """Handle the older/newer buttons under a history page"""
+    query = update.callback_query
+    try:
+        await query.answer()
+        direction, cursor = decode_history_cursor(query.data)
+        page = await Database.get_chat_history_page(
+            update.effective_chat.id,
+            limit=HISTORY_PAGE_SIZE,
+            before=cursor if direction == "o" else None,
+            after=cursor if direction == "n" else None
+        )
+        if not page['items']:
+            return
+
+        response, reply_markup = render_history_page(page)
+        await query.edit_message_text(response, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"History page error: {e}")
+
+def find_snippet(text, terms, width=120):
+    """Slice of text around the first search term it contains"""
+    folded = text.casefold()
+    positions = [folded.find(term.strip('"-').casefold()) for term in terms.split()]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    snippet = text[start:start + width].replace("\n", " ")
+    return ("…" if start else "") + snippet + ("…" if start + width < len(text) else "")
+
+def render_find_hit(hit, terms):
+    entry = f"🕒 {hit['timestamp']:%Y-%m-%d %H:%M}\n"
+    if hit['kind'] == "image":
+        return entry + f"🖼 {find_snippet(hit['description'], terms)}\n\n"
+    entry += f"You: {find_snippet(hit['user_message'], terms, 60)}\n"
+    return entry + f"Bot: {find_snippet(hit['bot_response'], terms)}\n\n"
+
+def render_find_page(token, search, page):
+    """Format one page of /find hits and its previous/next buttons"""
+    hits = search['hits']
+    first = page * FIND_PAGE_SIZE
+    response = f"🔎 Results for \"{search['terms']}\" ({first + 1}-{min(first + FIND_PAGE_SIZE, len(hits))} of {len(hits)})\n\n"
+    response += "".join(hits[first:first + FIND_PAGE_SIZE])
+
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"find:{token}:{page - 1}"))
+    if first + FIND_PAGE_SIZE < len(hits):
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"find:{token}:{page + 1}"))
+    return response, InlineKeyboardMarkup([buttons]) if buttons else None
+
+@instrument("find_command")
+@rate_limit
+async def find_command(update: Update, context: CallbackContext):
+    """Handle /find <terms>: ranked search over past answers and image analyses"""
+    try:
+        chat_id = update.effective_chat.id
+        user = await Database.get_user(chat_id)
+        if not user or not user.get('verified'):
+            await request_contact(update)
+            return
+
+        terms = " ".join(context.args or [])
+        if not terms:
+            await update.message.reply_text("🔎 Usage: /find <words to look for>")
+            return
+
+        hits = await Database.search_history(chat_id, terms, FIND_MAX_RESULTS)
+        if not hits:
+            await update.message.reply_text(f"🔎 Nothing found for \"{terms}\"")
+            return
+
+        token = secrets.token_hex(4)
+        # Keep only the rendered snippets, not whole answers
+        search = {"terms": terms, "hits": [render_find_hit(hit, terms) for hit in hits]}
+        find_results.set(token, search)
+        response, reply_markup = render_find_page(token, search, 0)
+        await update.message.reply_text(response, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Find error: {e}")
+        await update.message.reply_text("⚠️ Search failed. Please try again.")
+
+@instrument("find_page_callback")
+async def find_page_callback(update: Update, context: CallbackContext):
+    """Handle the previous/next buttons under /find results"""
+    query = update.callback_query
+    try:
+        _, token, page = query.data.split(":")
+        search = find_results.get(token)
+        if search is None:
+            await query.answer("These results expired, run /find again.")
+            return
+
+        await query.answer()
+        response, reply_markup = render_find_page(token, search, int(page))
+        await query.edit_message_text(response, reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Find page error: {e}")
+
 async def show_settings(update: Update):
     """Show settings menu"""
     try:
@@ -220,88 +427,189 @@ async def show_settings(update: Update):
             "1. Change language\n"
             "2. Notification preferences\n"
             "3. Reset account\n\n"
-            "Feature under development!"
+            "Feature under development!",
+            reply_markup=MAIN_MENU
         )
     except Exception as e:
         logger.error(f"Settings error: {e}")
 
-@rate_limit
+@instrument("handle_image")
 async def handle_image(update: Update, context: CallbackContext):
-    """Handle image analysis requests"""
+    """Route photos: album parts are batched, single photos analyzed directly"""
+    if update.message.media_group_id:
+        media_groups.add(update, context)
+        return
+    await handle_single_image(update, context)
+
+@rate_limit
+async def handle_single_image(update: Update, context: CallbackContext):
+    """Queue image analysis requests"""
     try:
         chat_id = update.effective_chat.id
-        user = Database.get_user(chat_id)
+        user = await Database.get_user(chat_id)
         
         if not user or not user.get('verified'):
             await request_contact(update)
             return
-        
-        await context.bot.send_chat_action(
-            chat_id=chat_id,
-            action=ChatAction.UPLOAD_PHOTO
-        )
-        
-        photo = await update.message.photo[-1].get_file()
-        image_bytes = await photo.download_as_bytearray()
-        
-        # Convert bytearray to bytes
-        image_data = bytes(image_bytes)
-        
+
+        await jobs.enqueue("image", chat_id, {
+            "photo": [size.to_dict() for size in update.message.photo],
+            "message_id": update.message.message_id
+        })
+    except Exception as e:
+        logger.error(f"Image handler error: {str(e)}")
+        await update.message.reply_text(QUEUE_ERROR_MESSAGE, reply_markup=MAIN_MENU)
+
+@instrument("image_job")
+async def run_image_job(bot, job):
+    """Analyze a queued photo and reply to it"""
+    chat_id = job['chat_id']
+    photo = [PhotoSize.de_json(size, bot) for size in job['payload']['photo']]
+    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_PHOTO)
+
+    try:
+        # Right-sized download, cached by file_unique_id and content hash
+        result = await analyze_photo(chat_id, photo, GEMINI_TIMEOUT)
+    except asyncio.TimeoutError:
+        TIMEOUTS.labels("gemini_vision").inc()
+        raise
+
+    await send_in_chunks(
+        bot,
+        chat_id,
+        f"🖼 **Analysis**\n\n{result['analysis']}",
+        reply_to=job['payload']['message_id'],
+        reply_markup=MAIN_MENU,
+        parse_mode="Markdown"
+    )
+    await Database.save_image(
+        chat_id,
+        result['file_id'],
+        result['analysis'],
+        file_unique_id=result['file_unique_id'],
+        content_hash=result['content_hash']
+    )
+
+@instrument("handle_album")
+@rate_limit
+async def handle_album(update: Update, context: CallbackContext, updates):
+    """Queue every photo of an album as one analysis job"""
+    try:
+        chat_id = update.effective_chat.id
+        user = await Database.get_user(chat_id)
+
+        if not user or not user.get('verified'):
+            await request_contact(update)
+            return
+
+        await jobs.enqueue("album", chat_id, {
+            "photos": [[size.to_dict() for size in u.message.photo] for u in updates],
+            "message_id": update.message.message_id
+        })
+    except Exception as e:
+        logger.error(f"Album handler error: {str(e)}")
+        await update.message.reply_text(QUEUE_ERROR_MESSAGE, reply_markup=MAIN_MENU)
+
+@instrument("album_job")
+async def run_album_job(bot, job):
+    """Analyze a queued album in one request and reply once"""
+    chat_id = job['chat_id']
+    photos = [[PhotoSize.de_json(size, bot) for size in sizes] for sizes in job['payload']['photos']]
+    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_PHOTO)
+
+    images = await asyncio.gather(*(download_prepared(photo) for photo in photos))
+    prompt = ALBUM_PROMPT.format(count=len(images))
+    route = model_router.route("vision", images=len(images))
+    try:
         analysis = await asyncio.wait_for(
-            asyncio.to_thread(
-                GeminiHelper().analyze_image,
-                image_data  # Pass bytes instead of bytearray
+            gemini_scheduler.call(
+                route.upstream,
+                chat_id,
+                get_gemini().analyze_images,
+                images,
+                prompt,
+                route.model
             ),
             timeout=GEMINI_TIMEOUT
         )
-        
-        if len(analysis) > 4096:
-            analysis = analysis[:4000] + "\n... [truncated]"
-        
-        Database.save_image(chat_id, photo.file_id, analysis)
-        await update.message.reply_text(
-            f"🖼 **Analysis**\n\n{analysis}",
-            parse_mode="Markdown"
-        )
     except asyncio.TimeoutError:
-        logger.error("Image analysis timeout")
-        await update.message.reply_text("⌛ Image processing timed out. Please try again.")
-    except Exception as e:
-        logger.error(f"Image handler error: {str(e)}")
-        await update.message.reply_text("⚠️ Error processing image")
-    finally:
-        await show_main_menu(update, context)
+        TIMEOUTS.labels("gemini_vision").inc()
+        raise
+
+    await send_in_chunks(
+        bot,
+        chat_id,
+        f"🖼 **Album Analysis** ({len(images)} photos)\n\n{analysis}",
+        reply_to=job['payload']['message_id'],
+        reply_markup=MAIN_MENU,
+        parse_mode="Markdown"
+    )
+    for photo in photos:
+        await Database.save_image(chat_id, photo[-1].file_id, analysis)
 
+# Album photos arrive as separate updates; answer them as one request
+media_groups = MediaGroupCollector(
+    lambda updates, context: handle_album(updates[0], context, updates),
+    Config.MEDIA_GROUP_WINDOW
+)
+
+@instrument("handle_websearch")
 async def handle_websearch(update: Update, context: CallbackContext):
-    """Process web search results with enhanced reliability"""
+    """Queue a web search for the entered query"""
     try:
-        query = update.message.text
-        await context.bot.send_chat_action(
-            chat_id=update.effective_chat.id,
-            action=ChatAction.TYPING
-        )
-        
-        results = WebSearch.search(query)
-        
-        response = (
-            f"🌐 **Results for '{query}'**\n\n"
-            f"📝 Summary:\n{results['summary']}\n\n"
-            f"🔗 Links:\n" + "\n".join(f"- {link}" for link in results['links'])
-        )
-        
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await jobs.enqueue("search", update.effective_chat.id, {
+            "query": update.message.text,
+            "message_id": update.message.message_id
+        })
     except Exception as e:
         logger.error(f"Web search handler error: {str(e)}")
-        await update.message.reply_text("⚠️ Search service unavailable")
-    finally:
-        await show_main_menu(update, context)
+        await update.message.reply_text("⚠️ Search service unavailable", reply_markup=MAIN_MENU)
     return ConversationHandler.END
 
+@instrument("search_job")
+async def run_search_job(bot, job):
+    """Run a queued web search and reply with the summary and links"""
+    chat_id = job['chat_id']
+    query = job['payload']['query']
+    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+
+    results = await WebSearch.search(query, user_id=chat_id)
+
+    response = (
+        f"🌐 **Results for '{query}'**\n\n"
+        f"📝 Summary:\n{results['summary']}\n\n"
+        f"🔗 Links:\n" + "\n".join(f"- {link}" for link in results['links'])
+    )
+    await send_in_chunks(
+        bot,
+        chat_id,
+        response,
+        reply_to=job['payload']['message_id'],
+        reply_markup=MAIN_MENU,
+        parse_mode="Markdown"
+    )
+
+# Busy and open-circuit errors are answered at once: a retry minutes later helps nobody
+NO_RETRY = (SchedulerBusy, CircuitOpenError)
+jobs.register("text", run_text_job, notify_job_failure, no_retry=NO_RETRY + (StreamInterrupted,))
+jobs.register("image", run_image_job, notify_job_failure, no_retry=NO_RETRY)
+jobs.register("album", run_album_job, notify_job_failure, no_retry=NO_RETRY)
+jobs.register("search", run_search_job, notify_job_failure, no_retry=NO_RETRY)
+
+async def stats_command(update: Update, context: CallbackContext):
+    """Admin-only snapshot of latency, load and cache metrics"""
+    try:
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            await update.message.reply_text("⛔ This command is for admins only.")
+            return
+        await update.message.reply_text(metrics.summarize())
+    except Exception as e:
+        logger.error(f"Stats error: {e}")
+
 async def cancel(update: Update, context: CallbackContext):
     """Cancel current operation"""
     try:
-        await update.message.reply_text("Operation cancelled")
-        await show_main_menu(update, context)
+        await update.message.reply_text("Operation cancelled", reply_markup=MAIN_MENU)
     except Exception as e:
         logger.error(f"Cancel error: {e}")
     return ConversationHandler.END
@@ -312,42 +620,116 @@ async def error_handler(update: Update, context: CallbackContext):
     try:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="⚠️ An error occurred. Please try again later."
+            text="⚠️ An error occurred. Please try again later.",
+            reply_markup=MAIN_MENU
         )
-        await show_main_menu(update, context)
     except Exception as e:
         logger.error(f"Error handler error: {e}")
 
+async def post_init(application):
+    """Pre-warm clients, create indexes and start background workers once the event loop is running"""
+    global metrics_runner
+    if Config.METRICS_PORT:
+        # Up first, so probes get a 503 from /ready while the rest warms up
+        metrics_runner = await metrics.start_metrics_server(
+            Config.METRICS_HOST,
+            Config.METRICS_PORT + Config.WORKER_INDEX,
+            readiness.report
+        )
+    await prewarm()
+    Database.start_writer()
+    if Config.WORKER_INDEX == 0:
+        # One archiver is enough however many webhook workers run
+        await Database.ensure_retention_indexes()
+        Database.start_archiver()
+    # Resumes jobs left pending by the previous run
+    await jobs.start(application.bot)
+    readiness.mark_ready()
+
+async def post_stop(application):
+    """Stop the job workers while the bot can still send"""
+    # Shutdown closes the HTTP client; jobs still running then would burn
+    # an attempt on send errors instead of being handed back
+    await jobs.close()
+
+async def post_shutdown(application):
+    """Flush pending writes and release pooled connections on shutdown"""
+    await Database.stop_archiver()
+    await Database.stop_writer()
+    await WebSearch.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+def make_outbound_limiter():
+    """Pace Bot API calls; webhook workers each take a share of the global rate"""
+    workers = Config.WEBHOOK_WORKERS if Config.BOT_MODE == "webhook" else 1
+    return OutboundLimiter(
+        Config.TELEGRAM_GLOBAL_RATE / workers,
+        Config.TELEGRAM_GLOBAL_BURST,
+        Config.TELEGRAM_CHAT_RATE,
+        Config.TELEGRAM_CHAT_BURST,
+        Config.TELEGRAM_GROUP_RATE,
+        max_retries=Config.TELEGRAM_MAX_RETRIES
+    )
+
+def build_application():
+    """Create the Application with every handler registered"""
+    application = (
+        ApplicationBuilder()
+        .token(Config.TELEGRAM_TOKEN)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .rate_limiter(make_outbound_limiter())
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # Main conversation handler
+    conv_handler = ConversationHandler(
+        entry_points=[CommandHandler('start', start)],
+        states={
+            WEBSEARCH_PROMPT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_websearch)]
+        },
+        fallbacks=[CommandHandler('cancel', cancel)],
+        allow_reentry=True
+    )
+
+    # Register handlers
+    application.add_handler(conv_handler)
+    application.add_handler(CommandHandler('stats', stats_command))
+    application.add_handler(CommandHandler('find', find_command))
+    application.add_handler(MessageHandler(filters.CONTACT, contact_handler))
+    application.add_handler(CallbackQueryHandler(history_page_callback, pattern=r"^hist:"))
+    application.add_handler(CallbackQueryHandler(find_page_callback, pattern=r"^find:"))
+    application.add_handler(MessageHandler(filters.PHOTO, handle_image))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    application.add_error_handler(error_handler)
+    return application
+
 def main():
     """Initialize and run the bot"""
     try:
-        application = ApplicationBuilder().token(Config.TELEGRAM_TOKEN).build()
-
-        # Main conversation handler
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler('start', start)],
-            states={
-                WEBSEARCH_PROMPT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_websearch)]
-            },
-            fallbacks=[CommandHandler('cancel', cancel)],
-            allow_reentry=True
-        )
-
-        # Register handlers
-        application.add_handler(conv_handler)
-        application.add_handler(MessageHandler(filters.CONTACT, contact_handler))
-        application.add_handler(MessageHandler(filters.PHOTO, handle_image))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-        application.add_error_handler(error_handler)
+        for warning in Config.validate():
+            logger.warning(warning)
+        if Config.BOT_MODE == "webhook":
+            logger.info(f"Bot running in webhook mode with {Config.WEBHOOK_WORKERS} worker(s)...")
+            webhook.serve(build_application)
+            return
 
+        application = build_application()
         logger.info("Bot running successfully...")
         application.run_polling(
             poll_interval=0.5,
             timeout=10,
-            drop_pending_updates=True
+            drop_pending_updates=Config.DROP_PENDING_UPDATES
         )
+    except ConfigError as e:
+        logger.error(f"Configuration error: {e}")
+        raise SystemExit(1)
     except Exception as e:
         logger.error(f"Fatal startup error: {e}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
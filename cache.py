@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import time
+
+
+class TTLCache:
+    """Bounded in-process cache with LRU eviction and per-entry TTL
+
+    Bounded by entry count and, optionally, by the total ``sizeof`` of the
+    stored values (e.g. ``maxbytes`` with ``sizeof=len`` for strings).
+    """
+
+    def __init__(self, maxsize, ttl, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.currbytes = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            # Expired entries stay until evicted so get_stale can fall back on them
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key, default=None):
+        """Return a value even if its TTL has passed, as long as it is not evicted"""
+        entry = self._data.get(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        if key in self._data:
+            self._remove(key)
+        size = self.sizeof(value)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl), size)
+        self.currbytes += size
+        while len(self._data) > self.maxsize or (
+            self.maxbytes is not None and self.currbytes > self.maxbytes
+        ):
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self.currbytes = 0
+
+    def _remove(self, key):
+        value, _, size = self._data.pop(key)
+        self.currbytes -= size
+        return value
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.currbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -1,11 +1,176 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
+class ConfigError(Exception):
+    """Settings the bot cannot run with; raised before it starts serving"""
+
 class Config:
     TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     SERPER_API_KEY = os.getenv("SERPER_API_KEY")
     MONGODB_URI = os.getenv("MONGODB_URI")
-    REQUEST_LIMIT = 30  # Requests per minute
\ No newline at end of file
+    REQUEST_LIMIT = 30  # Requests per minute
+
+    # Mongo connection pool
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+    MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+    # Verified-user cache in front of Database.get_user
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))  # Seconds
+
+    # Gemini request scheduler
+    GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+    GEMINI_MAX_QUEUED = int(os.getenv("GEMINI_MAX_QUEUED", "64"))
+    GEMINI_MAX_QUEUED_PER_USER = int(os.getenv("GEMINI_MAX_QUEUED_PER_USER", "2"))
+
+    # Streaming replies
+    STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # Seconds between edits
+    TELEGRAM_MESSAGE_LIMIT = 4096
+
+    # Outbound Bot API pacing (Telegram allows ~30 msg/s overall, ~1/s per chat, 20/min per group)
+    TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # Per process, split across webhook workers
+    TELEGRAM_GLOBAL_BURST = int(os.getenv("TELEGRAM_GLOBAL_BURST", "5"))
+    TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+    TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+    TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+    TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))  # RetryAfter retries per call
+
+    # Gemini response cache
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # Seconds
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    RESPONSE_CACHE_MONGO = os.getenv("RESPONSE_CACHE_MONGO", "false").lower() == "true"
+
+    # Serper search client
+    SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+    SERPER_NEWS_URL = os.getenv("SERPER_NEWS_URL", "https://google.serper.dev/news")
+    SEARCH_NEWS = os.getenv("SEARCH_NEWS", "true").lower() == "true"  # Fetch news alongside web results
+    SEARCH_DIGEST_TOKENS = int(os.getenv("SEARCH_DIGEST_TOKENS", "400"))  # Result digest sent to the summarizer
+    SERPER_POOL_SIZE = int(os.getenv("SERPER_POOL_SIZE", "20"))
+    SERPER_MAX_RETRY_AFTER = float(os.getenv("SERPER_MAX_RETRY_AFTER", "10"))  # Seconds
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "600"))  # Seconds
+
+    # Rate limiter
+    RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # Seconds
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | mongo
+    RATE_LIMIT_MAX_TRACKED = int(os.getenv("RATE_LIMIT_MAX_TRACKED", "200000"))
+
+    # Write-behind persistence for messages and images
+    WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+    WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))  # Seconds
+    WRITE_MAX_PENDING = int(os.getenv("WRITE_MAX_PENDING", "10000"))
+    WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "5"))  # Failed batch retries before it is dropped
+    WRITE_RETRY_DELAY = float(os.getenv("WRITE_RETRY_DELAY", "0.5"))  # Seconds, doubled per retry
+
+    # Storage policy for messages and images. /find only sees the hot messages
+    # collection: archived messages drop out of it and out of the paged history,
+    # and of a compressed answer only its plain prefix is searchable.
+    COMPRESS_MIN_CHARS = int(os.getenv("COMPRESS_MIN_CHARS", "1024"))  # Longer bodies are stored zlib-compressed
+    COMPRESS_PREFIX_CHARS = int(os.getenv("COMPRESS_PREFIX_CHARS", "512"))  # Plain, text-indexed prefix; the rest is not searchable
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # 0 (default) keeps every message hot and searchable
+    ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))  # Seconds between archive passes
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+    ARCHIVE_BUCKET_SIZE = int(os.getenv("ARCHIVE_BUCKET_SIZE", "500"))  # Messages per archive document
+    ARCHIVE_TTL_DAYS = int(os.getenv("ARCHIVE_TTL_DAYS", "0"))  # 0 keeps archived messages forever
+    IMAGE_TTL_DAYS = int(os.getenv("IMAGE_TTL_DAYS", "0"))  # 0 keeps image analyses forever
+
+    # Serving mode
+    BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public HTTPS base URL Telegram posts to
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # Pending updates per worker
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"  # Polling mode
+
+    # Durable job queue for Gemini and search work
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))  # Concurrent jobs per process
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "10"))  # Seconds, doubled per attempt
+    JOB_LEASE = int(os.getenv("JOB_LEASE", "300"))  # Seconds before a crashed worker's job is retried
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))  # Seconds between idle queue checks
+    JOB_FAILED_TTL = int(os.getenv("JOB_FAILED_TTL", str(7 * 24 * 3600)))  # Seconds failed jobs are kept
+
+    # Startup
+    STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", "20"))  # Seconds the pre-warm may take before startup fails
+    STARTUP_CHECK_GEMINI = os.getenv("STARTUP_CHECK_GEMINI", "true").lower() == "true"  # Verify key and models at startup
+
+    # Multi-turn conversation context
+    CONTEXT_ENABLED = os.getenv("CONTEXT_ENABLED", "true").lower() == "true"
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # Prompt tokens, question included
+    CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))
+    CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "6"))
+    CONTEXT_FOLD_BATCH = int(os.getenv("CONTEXT_FOLD_BATCH", "4"))  # Turns folded into the summary at once
+    CONTEXT_TURN_CHARS = int(os.getenv("CONTEXT_TURN_CHARS", "1200"))
+
+    # Image analysis pipeline
+    IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))  # Pixels
+    IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+    MEDIA_GROUP_WINDOW = float(os.getenv("MEDIA_GROUP_WINDOW", "1.0"))  # Seconds to wait for more album photos
+
+    # Observability
+    # /metrics and /ready are off unless a port is set (e.g. 9464); webhook worker N uses port + N
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").split(",") if i.strip()}
+    WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+
+    # Upstream resilience: adaptive timeouts, hedging, circuit breakers
+    GEMINI_TIMEOUT_FLOOR = float(os.getenv("GEMINI_TIMEOUT_FLOOR", "5"))  # Seconds
+    GEMINI_TIMEOUT_CEILING = float(os.getenv("GEMINI_TIMEOUT_CEILING", "25"))
+    GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "false").lower() == "true"
+    SERPER_TIMEOUT_FLOOR = float(os.getenv("SERPER_TIMEOUT_FLOOR", "2"))
+    SERPER_TIMEOUT_CEILING = float(os.getenv("SERPER_TIMEOUT_CEILING", "10"))
+    SERPER_HEDGE = os.getenv("SERPER_HEDGE", "true").lower() == "true"
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # Seconds
+
+    # Gemini model routing; tiers are listed fastest/cheapest first
+    GEMINI_TEXT_MODELS = [m.strip() for m in os.getenv("GEMINI_TEXT_MODELS", "gemini-1.5-flash,gemini-pro").split(",") if m.strip()]
+    GEMINI_VISION_MODELS = [m.strip() for m in os.getenv("GEMINI_VISION_MODELS", "gemini-1.5-flash,gemini-pro-vision").split(",") if m.strip()]
+    ROUTE_BUDGET_CHAT = float(os.getenv("ROUTE_BUDGET_CHAT", "10"))  # Seconds of p95 latency a tier may have
+    ROUTE_BUDGET_SEARCH = float(os.getenv("ROUTE_BUDGET_SEARCH", "6"))
+    ROUTE_BUDGET_VISION = float(os.getenv("ROUTE_BUDGET_VISION", "15"))
+    ROUTE_BUDGET_SUMMARY = float(os.getenv("ROUTE_BUDGET_SUMMARY", "20"))
+    ROUTE_COMPLEX_CHARS = int(os.getenv("ROUTE_COMPLEX_CHARS", "600"))  # Longer questions go to the top tier
+    ROUTE_COMPLEX_IMAGES = int(os.getenv("ROUTE_COMPLEX_IMAGES", "3"))  # Albums this large go to the top vision tier
+    ROUTE_MAX_ERROR_RATE = float(os.getenv("ROUTE_MAX_ERROR_RATE", "0.25"))
+
+    @classmethod
+    def validate(cls):
+        """Raise ConfigError for settings that would otherwise only break the first request
+
+        Returns warnings about optional features that are switched off.
+        """
+        problems, warnings = [], []
+        if not cls.TELEGRAM_TOKEN or not re.fullmatch(r"\d+:[\w-]{30,}", cls.TELEGRAM_TOKEN):
+            problems.append("TELEGRAM_TOKEN is missing or not a bot token")
+        if not cls.GEMINI_API_KEY:
+            problems.append("GEMINI_API_KEY is not set")
+        if not cls.MONGODB_URI or not cls.MONGODB_URI.startswith(("mongodb://", "mongodb+srv://")):
+            problems.append("MONGODB_URI is missing or not a mongodb:// or mongodb+srv:// URI")
+        if not cls.GEMINI_TEXT_MODELS or not cls.GEMINI_VISION_MODELS:
+            problems.append("GEMINI_TEXT_MODELS and GEMINI_VISION_MODELS need at least one model each")
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            problems.append(f"BOT_MODE must be polling or webhook, not {cls.BOT_MODE!r}")
+        if cls.BOT_MODE == "webhook" and not (cls.WEBHOOK_URL or "").startswith("https://"):
+            problems.append("WEBHOOK_URL must be an https:// URL in webhook mode")
+        if cls.RATE_LIMIT_BACKEND not in ("memory", "mongo"):
+            problems.append(f"RATE_LIMIT_BACKEND must be memory or mongo, not {cls.RATE_LIMIT_BACKEND!r}")
+        if problems:
+            raise ConfigError("; ".join(problems))
+
+        if not cls.SERPER_API_KEY:
+            warnings.append("SERPER_API_KEY is not set, web search will fail")
+        return warnings
@@ -0,0 +1,131 @@
+from config import Config
+from database import Database
+from gemini_helper import get_gemini, is_error_response
+from scheduler import gemini_scheduler
+from model_router import model_router
+from datetime import datetime
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+PREAMBLE = "You are continuing a conversation with this user.\n\n"
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+RECENT_HEADER = "Recent messages:\n"
+QUESTION_HEADER = "\n\nUser's new message:\n"
+
+def estimate_tokens(text):
+    """Cheap token estimate; good enough to keep prompts inside a budget"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _clip(text, tokens):
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _format_turn(turn):
+    return f"User: {turn['user']}\nAssistant: {turn['bot']}"
+
+class ConversationContext:
+    """Builds budgeted multi-turn prompts from recent turns plus a rolling summary
+
+    Each chat keeps at most ``recent_turns + fold_batch`` verbatim turns.
+    Older turns are folded into the stored summary once, in a batch, so a
+    prompt costs the same number of tokens on turn 5 as on turn 500.
+    """
+
+    def __init__(self, token_budget, summary_tokens, recent_turns, fold_batch, turn_chars):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.recent_turns = recent_turns
+        self.fold_batch = fold_batch
+        self.turn_chars = turn_chars
+        self._folding = set()
+        self._tasks = set()
+
+    async def build_prompt(self, chat_id, question):
+        context = await Database.get_context(chat_id)
+        if not context or not (context.get("summary") or context.get("turns")):
+            return question
+
+        remaining = self.token_budget - estimate_tokens(
+            PREAMBLE + SUMMARY_HEADER + RECENT_HEADER + QUESTION_HEADER + question
+        )
+        sections = []
+        summary = context.get("summary")
+        if summary:
+            summary = _clip(summary, min(self.summary_tokens, max(remaining, 0)))
+            sections.append(SUMMARY_HEADER + summary)
+            remaining -= estimate_tokens(summary)
+
+        # Newest turns first until the budget runs out, then restore order
+        recent = []
+        for turn in reversed(context.get("turns") or []):
+            text = _format_turn(turn)
+            cost = estimate_tokens(text) + 1  # Separator
+            if cost > remaining:
+                break
+            recent.append(text)
+            remaining -= cost
+        if recent:
+            sections.append(RECENT_HEADER + "\n\n".join(reversed(recent)))
+
+        if not sections:
+            return question
+        return PREAMBLE + "\n\n".join(sections) + QUESTION_HEADER + question
+
+    def record_turn(self, chat_id, question, answer):
+        """Store the exchange in the background; never delays the reply"""
+        if is_error_response(answer):
+            return
+        task = asyncio.create_task(self._record(chat_id, question, answer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _record(self, chat_id, question, answer):
+        turn = {
+            "user": question[:self.turn_chars],
+            "bot": answer[:self.turn_chars],
+            "at": datetime.utcnow()
+        }
+        context = await Database.push_context_turn(chat_id, turn)
+        turns = (context or {}).get("turns") or []
+        if len(turns) >= self.recent_turns + self.fold_batch and chat_id not in self._folding:
+            self._folding.add(chat_id)
+            try:
+                await self._fold(chat_id, context.get("summary"), turns[:len(turns) - self.recent_turns])
+            finally:
+                self._folding.discard(chat_id)
+
+    async def _fold(self, chat_id, summary, turns):
+        """Merge the oldest turns into the summary; only new turns are read"""
+        transcript = "\n\n".join(_format_turn(turn) for turn in turns)
+        prompt = (
+            f"Update the running summary of a conversation. Keep every fact, preference "
+            f"and open question the assistant may need later, in at most "
+            f"{self.summary_tokens * 3 // 4} words.\n\n"
+            f"Current summary:\n{summary or '(empty)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            f"Updated summary:"
+        )
+        try:
+            route = model_router.route("summary", transcript)
+            updated = await gemini_scheduler.call(
+                route.upstream, chat_id, get_gemini().generate_text, prompt, route.model
+            )
+        except Exception as e:
+            # Turns stay in the recent window and are folded on a later turn
+            logger.error(f"Context summary error: {e}")
+            return
+        if is_error_response(updated):
+            return
+        await Database.fold_context(chat_id, _clip(updated.strip(), self.summary_tokens), turns[-1]["at"])
+
+context_engine = ConversationContext(
+    Config.CONTEXT_TOKEN_BUDGET,
+    Config.CONTEXT_SUMMARY_TOKENS,
+    Config.CONTEXT_RECENT_TURNS,
+    Config.CONTEXT_FOLD_BATCH,
+    Config.CONTEXT_TURN_CHARS
+)
@@ -1,71 +1,648 @@
-from pymongo import MongoClient
-from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+from bson import Binary
 from config import Config
+from cache import TTLCache
+from write_behind import WriteBehindBuffer
+from metrics import MongoCommandMetrics, WRITE_PENDING, WRITE_FLUSHES, WRITE_MAX_FLUSH, WRITE_FAILED, CACHE_HIT_RATE
+import asyncio
+import json
 import logging
+import zlib
 
 logger = logging.getLogger(__name__)
 
-client = MongoClient(Config.MONGODB_URI)
-db = client.telegram_bot
+class _LazyDatabase:
+    """Stands in for the Motor database until the first query creates the client"""
+
+    def __getattr__(self, name):
+        return getattr(connect(), name)
+
+    def __getitem__(self, name):
+        return connect()[name]
+
+client = None
+db = _LazyDatabase()
+
+def connect():
+    """Create the Mongo client on first use and return the database
+
+    Importing this module stays cheap, and a malformed URI or an SRV record
+    that does not resolve raises here, from the startup pre-warm, rather
+    than in the first handler that queries.
+    """
+    global client, db
+    if isinstance(db, _LazyDatabase):
+        client = AsyncIOMotorClient(
+            Config.MONGODB_URI,
+            maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=Config.MONGO_MAX_IDLE_MS,
+            waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            event_listeners=[MongoCommandMetrics()]
+        )
+        db = client.telegram_bot
+    return db
+
+# Indexes the queries below rely on: {collection: [(keys, name), ...]}
+INDEXES = {
+    "users": [
+        ([("chat_id", ASCENDING)], "chat_id_1"),
+    ],
+    "messages": [
+        ([("chat_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], "chat_id_timestamp_id"),
+        # chat_id prefix: a /find only walks the postings of one chat
+        ([("chat_id", ASCENDING), ("user_message", TEXT), ("bot_response", TEXT)], "chat_id_text"),
+        ([("timestamp", ASCENDING)], "timestamp_1"),
+    ],
+    "messages_archive": [
+        ([("chat_id", ASCENDING), ("last", DESCENDING)], "chat_id_last"),
+        ([("ids", ASCENDING)], "ids_1"),
+    ],
+    "images": [
+        ([("chat_id", ASCENDING), ("timestamp", DESCENDING)], "chat_id_timestamp"),
+        ([("file_unique_id", ASCENDING)], "file_unique_id_1"),
+        ([("content_hash", ASCENDING)], "content_hash_1"),
+        ([("chat_id", ASCENDING), ("description", TEXT)], "chat_id_text"),
+    ],
+    "contexts": [
+        ([("chat_id", ASCENDING)], "chat_id_1"),
+    ],
+    "jobs": [
+        ([("status", ASCENDING), ("run_at", ASCENDING)], "status_run_at"),
+    ],
+}
+
+user_cache = TTLCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+archiver = None
+
+def pack_text(document, field):
+    """Store a long field zlib-compressed as <field>_z, keeping a plain prefix for the text index"""
+    text = document.get(field)
+    if text and len(text) > Config.COMPRESS_MIN_CHARS:
+        document[f"{field}_z"] = Binary(zlib.compress(text.encode(), 6))
+        document[field] = text[:Config.COMPRESS_PREFIX_CHARS]
+    return document
+
+def unpack_text(document, field):
+    packed = document.pop(f"{field}_z", None)
+    if packed is not None:
+        document[field] = zlib.decompress(packed).decode()
+    return document
 
 class Database:
+    """Async data layer; every call yields to the event loop while Mongo works"""
+
     @staticmethod
-    def get_user(chat_id):
+    def use(database):
+        """Swap the backing database (e.g. a mongomock-motor instance in tests)"""
+        global db
+        db = database
+
+    @staticmethod
+    async def get_user(chat_id):
+        cached = user_cache.get(chat_id)
+        if cached is not None:
+            return cached
         try:
-            return db.users.find_one({"chat_id": chat_id})
+            user = await db.users.find_one({"chat_id": chat_id})
+            if user is not None:
+                user_cache.set(chat_id, user)
+            return user
         except Exception as e:
             logger.error(f"Get user error: {e}")
             return None
 
     @staticmethod
-    def create_user(user_data):
+    async def create_user(user_data):
         try:
-            return db.users.insert_one(user_data)
+            result = await db.users.insert_one(user_data)
+            user_cache.set(user_data["chat_id"], user_data)
+            return result
         except Exception as e:
             logger.error(f"Create user error: {e}")
 
     @staticmethod
-    def update_phone(chat_id, phone):
+    async def update_phone(chat_id, phone):
         try:
-            return db.users.update_one(
+            result = await db.users.update_one(
                 {"chat_id": chat_id},
                 {"$set": {"phone": phone, "verified": True}},
                 upsert=True
             )
+            cached = user_cache.pop(chat_id)
+            if cached is not None:
+                user_cache.set(chat_id, {**cached, "phone": phone, "verified": True})
+            return result
         except Exception as e:
             logger.error(f"Update phone error: {e}")
 
     @staticmethod
-    def save_message(chat_id, user_message, bot_response):
+    def user_cache_stats():
+        return user_cache.stats()
+
+    @staticmethod
+    async def save_message(chat_id, user_message, bot_response):
         try:
-            return db.messages.insert_one({
+            await write_buffer.put("messages", pack_text({
                 "chat_id": chat_id,
                 "user_message": user_message,
                 "bot_response": bot_response,
                 "timestamp": datetime.utcnow()
-            })
+            }, "bot_response"))
         except Exception as e:
             logger.error(f"Save message error: {e}")
 
     @staticmethod
-    def save_image(chat_id, file_id, description):
+    async def save_image(chat_id, file_id, description, file_unique_id=None, content_hash=None):
+        document = {
+            "chat_id": chat_id,
+            "file_id": file_id,
+            "description": description,
+            "timestamp": datetime.utcnow()
+        }
+        # Cache keys are only stored for analyses worth reusing
+        if file_unique_id:
+            document["file_unique_id"] = file_unique_id
+        if content_hash:
+            document["content_hash"] = content_hash
         try:
-            return db.images.insert_one({
-                "chat_id": chat_id,
-                "file_id": file_id,
-                "description": description,
-                "timestamp": datetime.utcnow()
-            })
+            await write_buffer.put("images", pack_text(document, "description"))
         except Exception as e:
             logger.error(f"Save image error: {e}")
 
     @staticmethod
-    def get_chat_history(chat_id, limit=10):
+    async def find_image_analysis(file_unique_id=None, content_hash=None):
+        """Most recent stored description of the same image, from any chat"""
+        query = {"file_unique_id": file_unique_id} if file_unique_id else {"content_hash": content_hash}
         try:
-            return list(db.messages.find(
+            doc = await db.images.find_one(
+                query,
+                {"_id": 0, "description": 1, "description_z": 1},
+                sort=[("timestamp", DESCENDING)]
+            )
+            return unpack_text(doc, "description")["description"] if doc else None
+        except Exception as e:
+            logger.error(f"Find image analysis error: {e}")
+            return None
+
+    @staticmethod
+    async def insert_many(collection, documents):
+        try:
+            await db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # insert_many set each _id in place, so a retried batch only collides with what it already wrote
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    @staticmethod
+    def start_writer():
+        write_buffer.start()
+
+    @staticmethod
+    async def stop_writer():
+        await write_buffer.close()
+
+    @staticmethod
+    def write_buffer_stats():
+        return write_buffer.stats()
+
+    @staticmethod
+    async def get_chat_history(chat_id, limit=10):
+        """Newest messages first, continuing into the archive once the hot tier runs out"""
+        try:
+            cursor = db.messages.find(
                 {"chat_id": chat_id},
-                {"_id": 0, "user_message": 1, "bot_response": 1, "timestamp": 1}
-            ).sort("timestamp", -1).limit(limit))
+                {"_id": 0, "user_message": 1, "bot_response": 1, "bot_response_z": 1, "timestamp": 1}
+            ).sort("timestamp", -1).limit(limit)
+            history = [unpack_text(doc, "bot_response") for doc in await cursor.to_list(length=limit)]
+            if len(history) < limit:
+                history += await Database.get_archived_history(chat_id, limit - len(history))
+            return history
         except Exception as e:
             logger.error(f"Chat history error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    @staticmethod
+    async def get_archived_history(chat_id, limit=10):
+        """Newest archived messages first, in the same shape as get_chat_history"""
+        history = []
+        cursor = db.messages_archive.find({"chat_id": chat_id}, {"data": 1}).sort("last", DESCENDING)
+        async for bucket in cursor:
+            entries = json.loads(zlib.decompress(bucket["data"]))
+            for entry in reversed(entries):
+                history.append({
+                    "user_message": entry["q"],
+                    "bot_response": entry["a"],
+                    "timestamp": datetime.fromisoformat(entry["t"])
+                })
+                if len(history) >= limit:
+                    return history
+        return history
+
+    @staticmethod
+    async def archive_messages(before, batch_size, bucket_size):
+        """Move one batch of messages older than ``before`` into archive buckets
+
+        A bucket holds up to ``bucket_size`` messages of one chat as a single
+        zlib-compressed JSON blob, so archived history costs one small
+        document per chat and period instead of one per message. Each
+        bucket lists its message ids in an indexed array, so a pass that
+        died between writing buckets and deleting the originals skips the
+        messages it already archived when it runs again.
+        Returns the number of messages moved.
+        """
+        docs = await db.messages.find({"timestamp": {"$lt": before}}).sort("timestamp", ASCENDING) \
+            .limit(batch_size).to_list(length=batch_size)
+        by_chat = {}
+        for doc in docs:
+            by_chat.setdefault(doc["chat_id"], []).append(unpack_text(doc, "bot_response"))
+
+        for chat_id, messages in by_chat.items():
+            archived = set()
+            async for done in db.messages_archive.find(
+                {"ids": {"$in": [str(doc["_id"]) for doc in messages]}}, {"ids": 1}
+            ):
+                archived.update(done["ids"])
+            messages = [doc for doc in messages if str(doc["_id"]) not in archived]
+            if not messages:
+                continue
+
+            bucket = await db.messages_archive.find_one(
+                {"chat_id": chat_id, "count": {"$lt": bucket_size}},
+                sort=[("last", DESCENDING)]
+            )
+            entries = json.loads(zlib.decompress(bucket["data"])) if bucket else []
+            entries += [
+                {"id": str(doc["_id"]), "t": doc["timestamp"].isoformat(), "q": doc["user_message"], "a": doc["bot_response"]}
+                for doc in messages
+            ]
+            # Fill the open bucket, then start new ones
+            chunks = [entries[:bucket_size]] + [
+                entries[start:start + bucket_size] for start in range(bucket_size, len(entries), bucket_size)
+            ]
+            for index, chunk in enumerate(chunks):
+                await db.messages_archive.replace_one(
+                    {"_id": bucket["_id"] if bucket and index == 0 else f"{chat_id}:{chunk[0]['id']}"},
+                    {
+                        "chat_id": chat_id,
+                        "count": len(chunk),
+                        "ids": [entry["id"] for entry in chunk],
+                        "first": datetime.fromisoformat(chunk[0]["t"]),
+                        "last": datetime.fromisoformat(chunk[-1]["t"]),
+                        "data": Binary(zlib.compress(json.dumps(chunk, ensure_ascii=False).encode(), 9))
+                    },
+                    upsert=True
+                )
+
+        if docs:
+            await db.messages.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        return len(docs)
+
+    @staticmethod
+    def start_archiver():
+        """Periodically move messages past ARCHIVE_AFTER_DAYS out of the hot collection"""
+        global archiver
+        if Config.ARCHIVE_AFTER_DAYS and archiver is None:
+            archiver = asyncio.create_task(Database._archive_loop())
+
+    @staticmethod
+    async def stop_archiver():
+        global archiver
+        if archiver is not None:
+            archiver.cancel()
+            await asyncio.gather(archiver, return_exceptions=True)
+            archiver = None
+
+    @staticmethod
+    async def _archive_loop():
+        while True:
+            try:
+                before = datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+                total = 0
+                while True:
+                    moved = await Database.archive_messages(
+                        before, Config.ARCHIVE_BATCH_SIZE, Config.ARCHIVE_BUCKET_SIZE
+                    )
+                    total += moved
+                    if moved < Config.ARCHIVE_BATCH_SIZE:
+                        break
+                if total:
+                    logger.info(f"Archived {total} messages older than {before:%Y-%m-%d}")
+            except Exception as e:
+                logger.error(f"Archive error: {e}")
+            await asyncio.sleep(Config.ARCHIVE_INTERVAL)
+
+    @staticmethod
+    async def ensure_retention_indexes():
+        """TTL expiry for the archive and image analyses, as configured"""
+        await Database._ensure_ttl_index("messages_archive", "last", Config.ARCHIVE_TTL_DAYS)
+        await Database._ensure_ttl_index("images", "timestamp", Config.IMAGE_TTL_DAYS)
+
+    @staticmethod
+    async def _ensure_ttl_index(collection, field, days):
+        name = f"{field}_ttl"
+        try:
+            if not days:
+                if name in await db[collection].index_information():
+                    await db[collection].drop_index(name)
+                return
+            try:
+                await db[collection].create_index(field, name=name, expireAfterSeconds=days * 86400)
+            except OperationFailure:
+                # Index exists with another expiry; change it in place
+                await db.command("collMod", collection, index={"name": name, "expireAfterSeconds": days * 86400})
+        except Exception as e:
+            logger.error(f"TTL index error ({collection}.{name}): {e}")
+
+    @staticmethod
+    async def get_chat_history_page(chat_id, limit=10, before=None, after=None):
+        """Keyset-paginated history, newest first
+
+        ``before``/``after`` are ``(timestamp, _id)`` cursors taken from the
+        last/first item of a previous page. Returns the page items plus
+        whether older and newer items exist.
+        """
+        query = {"chat_id": chat_id}
+        cursor_key, op, order = (before, "$lt", DESCENDING) if after is None else (after, "$gt", ASCENDING)
+        if cursor_key is not None:
+            timestamp, object_id = cursor_key
+            query["$or"] = [
+                {"timestamp": {op: timestamp}},
+                {"timestamp": timestamp, "_id": {op: object_id}}
+            ]
+
+        try:
+            cursor = db.messages.find(
+                query,
+                {"user_message": 1, "bot_response": 1, "bot_response_z": 1, "timestamp": 1}
+            ).sort([("timestamp", order), ("_id", order)]).limit(limit + 1)
+            items = [unpack_text(doc, "bot_response") for doc in await cursor.to_list(length=limit + 1)]
+        except Exception as e:
+            logger.error(f"Chat history page error: {e}")
+            return {"items": [], "has_older": False, "has_newer": False}
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        if after is None:
+            return {"items": items, "has_older": has_more, "has_newer": before is not None}
+        items.reverse()
+        return {"items": items, "has_older": True, "has_newer": has_more}
+
+    @staticmethod
+    async def search_history(chat_id, terms, limit):
+        """Text search over a chat's messages and image analyses, best match first
+
+        Archived messages are not searched, and compressed answers only
+        match on their plain COMPRESS_PREFIX_CHARS prefix.
+        """
+        query = {"chat_id": chat_id, "$text": {"$search": terms}}
+        score = {"score": {"$meta": "textScore"}}
+        try:
+            messages, images = await asyncio.gather(
+                db.messages.find(query, {**score, "user_message": 1, "bot_response": 1, "bot_response_z": 1, "timestamp": 1})
+                .sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(length=limit),
+                db.images.find(query, {**score, "description": 1, "description_z": 1, "timestamp": 1})
+                .sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(length=limit)
+            )
+        except Exception as e:
+            logger.error(f"Search history error: {e}")
+            return []
+        hits = [{"kind": "message", **unpack_text(doc, "bot_response")} for doc in messages] + \
+            [{"kind": "image", **unpack_text(doc, "description")} for doc in images]
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:limit]
+
+    @staticmethod
+    async def get_context(chat_id):
+        try:
+            return await db.contexts.find_one({"chat_id": chat_id}, {"_id": 0, "summary": 1, "turns": 1})
+        except Exception as e:
+            logger.error(f"Get context error: {e}")
+            return None
+
+    @staticmethod
+    async def push_context_turn(chat_id, turn):
+        """Append a turn to the chat's recent window; returns the updated context"""
+        try:
+            return await db.contexts.find_one_and_update(
+                {"chat_id": chat_id},
+                {"$push": {"turns": turn}, "$set": {"updated_at": datetime.utcnow()}},
+                projection={"_id": 0, "summary": 1, "turns": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Push context turn error: {e}")
+            return None
+
+    @staticmethod
+    async def fold_context(chat_id, summary, through):
+        """Store a new rolling summary and drop the turns it now covers"""
+        try:
+            return await db.contexts.update_one(
+                {"chat_id": chat_id},
+                {
+                    "$set": {"summary": summary, "updated_at": datetime.utcnow()},
+                    "$pull": {"turns": {"at": {"$lte": through}}}
+                }
+            )
+        except Exception as e:
+            logger.error(f"Fold context error: {e}")
+
+    @staticmethod
+    async def ping():
+        """One round trip to the server, connecting the client if needed"""
+        return await connect().command("ping")
+
+    @staticmethod
+    async def ensure_indexes():
+        """Create the indexes in INDEXES and verify they exist; returns missing names"""
+        async def ensure(collection, indexes):
+            for keys, name in indexes:
+                try:
+                    await db[collection].create_index(keys, name=name, background=True)
+                except Exception as e:
+                    logger.error(f"Index creation error ({collection}.{name}): {e}")
+            try:
+                existing = await db[collection].index_information()
+            except Exception as e:
+                logger.error(f"Index check error ({collection}): {e}")
+                existing = {}
+            # Text indexes are stored under internal _fts keys, so only their name is checked
+            return [
+                f"{collection}.{name}" for keys, name in indexes
+                if name not in existing
+                or (not any(direction == TEXT for _, direction in keys) and existing[name].get("key") != keys)
+            ]
+
+        # Collections are independent, so a cold start waits for the slowest one, not their sum
+        results = await asyncio.gather(*(ensure(collection, indexes) for collection, indexes in INDEXES.items()))
+        missing = [name for names in results for name in names]
+
+        if missing:
+            logger.error(f"Missing indexes: {', '.join(missing)}")
+        else:
+            logger.info("All required indexes present")
+        return missing
+
+    @staticmethod
+    async def ensure_response_cache_index(ttl):
+        try:
+            await db.response_cache.create_index("created_at", expireAfterSeconds=ttl)
+        except Exception as e:
+            logger.error(f"Response cache index error: {e}")
+
+    @staticmethod
+    async def get_cached_response(key, ttl):
+        try:
+            doc = await db.response_cache.find_one(
+                {"_id": key, "created_at": {"$gt": datetime.utcnow() - timedelta(seconds=ttl)}},
+                {"response": 1}
+            )
+            return doc["response"] if doc else None
+        except Exception as e:
+            logger.error(f"Get cached response error: {e}")
+            return None
+
+    @staticmethod
+    async def save_cached_response(key, model, response):
+        try:
+            return await db.response_cache.update_one(
+                {"_id": key},
+                {"$set": {"model": model, "response": response, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Save cached response error: {e}")
+
+    @staticmethod
+    async def ensure_rate_limit_index():
+        try:
+            await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.error(f"Rate limit index error: {e}")
+
+    @staticmethod
+    async def hit_rate_window(user_id, index, window):
+        """Count one hit in the current window; return (previous, current) counts"""
+        current = await db.rate_limits.find_one_and_update(
+            {"_id": f"{user_id}:{index}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": datetime.utcfromtimestamp((index + 2) * window)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        previous = await db.rate_limits.find_one({"_id": f"{user_id}:{index - 1}"}, {"count": 1})
+        return (previous["count"] if previous else 0), current["count"]
+
+    @staticmethod
+    async def release_rate_hit(user_id, index):
+        await db.rate_limits.update_one({"_id": f"{user_id}:{index}"}, {"$inc": {"count": -1}})
+
+    @staticmethod
+    async def ensure_job_ttl_index(ttl):
+        try:
+            await db.jobs.create_index("finished_at", expireAfterSeconds=ttl)
+        except Exception as e:
+            logger.error(f"Job index error: {e}")
+
+    @staticmethod
+    async def enqueue_job(job):
+        """Insert a job durably; raises so the caller can tell the user it was not queued"""
+        result = await db.jobs.insert_one(job)
+        return result.inserted_id
+
+    @staticmethod
+    async def claim_job(query, lease):
+        """Atomically take the oldest due job matching query for ``lease`` seconds
+
+        A claimed job's run_at becomes its lease expiry, so jobs of a
+        crashed worker become due again on their own.
+        """
+        now = datetime.utcnow()
+        return await db.jobs.find_one_and_update(
+            {**query, "status": {"$in": ["pending", "running"]}, "run_at": {"$lte": now}},
+            {
+                "$set": {"status": "running", "run_at": now + timedelta(seconds=lease), "claimed_at": now},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    async def held_job_chats(query):
+        """Chats matching query with an attempted job that has not finished yet"""
+        return await db.jobs.distinct(
+            "chat_id",
+            {**query, "status": {"$in": ["pending", "running"]}, "attempts": {"$gt": 0}}
+        )
+
+    @staticmethod
+    async def complete_job(job_id):
+        try:
+            await db.jobs.delete_one({"_id": job_id})
+        except Exception as e:
+            logger.error(f"Complete job error: {e}")
+
+    @staticmethod
+    async def retry_job(job_id, delay, error):
+        try:
+            await db.jobs.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "status": "pending",
+                    "run_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "error": error
+                }}
+            )
+        except Exception as e:
+            logger.error(f"Retry job error: {e}")
+
+    @staticmethod
+    async def fail_job(job_id, error):
+        try:
+            await db.jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "failed", "error": error, "finished_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error(f"Fail job error: {e}")
+
+    @staticmethod
+    async def release_jobs(job_ids):
+        """Hand interrupted jobs back without counting the attempt"""
+        try:
+            await db.jobs.update_many(
+                {"_id": {"$in": job_ids}, "status": "running"},
+                {"$set": {"status": "pending", "run_at": datetime.utcnow()}, "$inc": {"attempts": -1}}
+            )
+        except Exception as e:
+            logger.error(f"Release jobs error: {e}")
+
+    @staticmethod
+    async def count_jobs(status):
+        try:
+            return await db.jobs.count_documents({"status": status})
+        except Exception as e:
+            logger.error(f"Count jobs error: {e}")
+            return 0
+
+write_buffer = WriteBehindBuffer(
+    Database.insert_many,
+    Config.WRITE_BATCH_SIZE,
+    Config.WRITE_FLUSH_INTERVAL,
+    Config.WRITE_MAX_PENDING,
+    Config.WRITE_MAX_RETRIES,
+    Config.WRITE_RETRY_DELAY
+)
+WRITE_PENDING.set_function(lambda: write_buffer.stats()["pending"])
+WRITE_FLUSHES.set_function(lambda: write_buffer.flushes)
+WRITE_MAX_FLUSH.set_function(lambda: write_buffer.max_flush_ms / 1000)
+WRITE_FAILED.set_function(lambda: write_buffer.failed_docs)
+CACHE_HIT_RATE.labels("user").set_function(lambda: user_cache.stats()["hit_rate"])
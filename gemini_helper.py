@@ -1,5 +1,5 @@
-import google.generativeai as genai
-from config import Config
+from config import Config, ConfigError
+from metrics import observe
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,33 +7,107 @@ logger = logging.getLogger(__name__)
 class GeminiHelper:
     def __init__(self):
         try:
+            # The SDK takes about a second to import; only pay for it once Gemini is needed
+            import google.generativeai as genai
             genai.configure(api_key=Config.GEMINI_API_KEY)
-            self.text_model = genai.GenerativeModel('gemini-pro')
-            self.vision_model = genai.GenerativeModel('gemini-pro-vision')
+            self.genai = genai
+            self.text_model_name = Config.GEMINI_TEXT_MODELS[0]
+            self.vision_model_name = Config.GEMINI_VISION_MODELS[0]
+            self._models = {}
         except Exception as e:
             logger.error(f"Gemini initialization failed: {str(e)}")
             raise
 
-    def generate_text(self, prompt):
+    def model(self, name):
+        """GenerativeModel for a tier, created on first use"""
+        model = self._models.get(name)
+        if model is None:
+            model = self._models[name] = self.genai.GenerativeModel(name)
+        return model
+
+    def warm(self, model_names, check=True, timeout=5.0):
+        """Build the tier models and the API client ahead of the first request
+
+        With ``check`` every model is looked up once, which opens the
+        connection and turns a rejected key or an unknown model name into
+        a ConfigError. Network trouble is only logged: the API may be
+        back by the time a user asks something.
+        """
+        from google.api_core.exceptions import ClientError
+        from google.generativeai import client
+
+        client.get_default_generative_client()
+        for name in model_names:
+            self.model(name)
+            if not check:
+                continue
+            try:
+                # One try with a short deadline: the default retries for a minute
+                self.genai.get_model(f"models/{name}", request_options={"timeout": timeout, "retry": None})
+            except ClientError as e:
+                raise ConfigError(f"Gemini rejected model {name}: {e}") from e
+            except Exception as e:
+                logger.warning(f"Gemini check for {name} failed: {e}")
+
+    def generate_text(self, prompt, model_name=None):
         try:
-            response = self.text_model.generate_content(prompt)
-            return response.text
+            with observe("gemini", "text"):
+                response = self.model(model_name or self.text_model_name).generate_content(prompt)
+                return response.text
         except Exception as e:
             logger.error(f"Text generation error: {str(e)}")
             return f"⚠️ Error generating response: {str(e)}"
 
-    def analyze_image(self, image_bytes, prompt="Describe this image in detail"):
+    def stream_text(self, prompt, model_name=None):
+        """Yield the response text chunk by chunk as the model produces it"""
+        try:
+            with observe("gemini", "text_stream"):
+                model = self.model(model_name or self.text_model_name)
+                for chunk in model.generate_content(prompt, stream=True):
+                    if chunk.text:
+                        yield chunk.text
+        except Exception as e:
+            logger.error(f"Text streaming error: {str(e)}")
+            raise
+
+    def analyze_image(self, image_bytes, prompt="Describe this image in detail", mime_type="image/jpeg", model_name=None):
         try:
-            response = self.vision_model.generate_content(
-                [
-                    prompt,
-                    {
-                        "mime_type": "image/png",  # or "image/jpeg" based on input
-                        "data": image_bytes  # Now receiving bytes
-                    }
-                ]
-            )
-            return response.text
+            with observe("gemini", "vision"):
+                response = self.model(model_name or self.vision_model_name).generate_content(
+                    [
+                        prompt,
+                        {
+                            "mime_type": mime_type,
+                            "data": image_bytes
+                        }
+                    ]
+                )
+                return response.text
         except Exception as e:
             logger.error(f"Image analysis error: {str(e)}")
-            return f"⚠️ Image processing failed: {str(e)}"
\ No newline at end of file
+            return f"⚠️ Image processing failed: {str(e)}"
+
+    def analyze_images(self, images, prompt, model_name=None):
+        """Analyze several (bytes, mime_type) images in a single request"""
+        try:
+            with observe("gemini", "vision_multi"):
+                response = self.model(model_name or self.vision_model_name).generate_content(
+                    [prompt] + [{"mime_type": mime_type, "data": data} for data, mime_type in images]
+                )
+                return response.text
+        except Exception as e:
+            logger.error(f"Multi-image analysis error: {str(e)}")
+            return f"⚠️ Image processing failed: {str(e)}"
+
+def is_error_response(text):
+    """True for the ⚠️ fallback strings returned instead of raising"""
+    return text.startswith("⚠️")
+
+_shared_helper = None
+
+def get_gemini():
+    """Return the process-wide GeminiHelper, configuring the SDK only once"""
+    global _shared_helper
+    if _shared_helper is None:
+        _shared_helper = GeminiHelper()
+    return _shared_helper
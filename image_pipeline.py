@@ -0,0 +1,111 @@
+from PIL import Image
+from config import Config
+from database import Database
+from gemini_helper import get_gemini, is_error_response
+from scheduler import gemini_scheduler
+from model_router import model_router
+import asyncio
+import hashlib
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_PROMPT = "Describe this image in detail"
+ALBUM_PROMPT = (
+    "These {count} images were sent together as an album. Describe each one "
+    "briefly in order, then explain what they show as a whole."
+)
+SUPPORTED_MIME_TYPES = ("image/jpeg", "image/png", "image/webp")
+
+def detect_mime(data):
+    """Sniff the image format from its magic bytes"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+def pick_photo_size(photo_sizes, max_side):
+    """Smallest Telegram rendition that still covers max_side, else the largest"""
+    for size in sorted(photo_sizes, key=lambda s: s.width * s.height):
+        if max(size.width, size.height) >= max_side:
+            return size
+    return max(photo_sizes, key=lambda s: s.width * s.height)
+
+def prepare_image(data, max_side, quality):
+    """Downscale and re-encode to JPEG when it shrinks the upload; returns (bytes, mime)"""
+    mime = detect_mime(data)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_side and mime in SUPPORTED_MIME_TYPES:
+                return data, mime
+            image.thumbnail((max_side, max_side))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            encoded = io.BytesIO()
+            image.save(encoded, "JPEG", quality=quality, optimize=True)
+            return encoded.getvalue(), "image/jpeg"
+    except Exception as e:
+        logger.error(f"Image preprocessing error: {e}")
+        return data, mime
+
+async def download(size):
+    photo = await size.get_file()
+    return bytes(await photo.download_as_bytearray())
+
+async def download_prepared(photo_sizes):
+    """Download the right-sized rendition and prepare it for upload"""
+    data = await download(pick_photo_size(photo_sizes, Config.IMAGE_MAX_SIDE))
+    return await asyncio.to_thread(
+        prepare_image, data, Config.IMAGE_MAX_SIDE, Config.IMAGE_JPEG_QUALITY
+    )
+
+async def analyze_photo(chat_id, photo_sizes, timeout):
+    """Analyze a Telegram photo, reusing earlier analyses of the same image
+
+    Looks up ``file_unique_id`` before downloading and the content hash
+    after, so repeat and forwarded images never reach Gemini.
+    """
+    size = pick_photo_size(photo_sizes, Config.IMAGE_MAX_SIDE)
+    result = {
+        "file_id": size.file_id,
+        "file_unique_id": size.file_unique_id,
+        "content_hash": None,
+        "cached": True
+    }
+
+    analysis = await Database.find_image_analysis(file_unique_id=size.file_unique_id)
+    if analysis is None:
+        data = await download(size)
+        result["content_hash"] = hashlib.sha256(data).hexdigest()
+        analysis = await Database.find_image_analysis(content_hash=result["content_hash"])
+
+    if analysis is None:
+        prepared, mime_type = await asyncio.to_thread(
+            prepare_image, data, Config.IMAGE_MAX_SIDE, Config.IMAGE_JPEG_QUALITY
+        )
+        route = model_router.route("vision", images=1)
+        analysis = await asyncio.wait_for(
+            gemini_scheduler.call(
+                route.upstream,
+                chat_id,
+                get_gemini().analyze_image,
+                prepared,
+                ANALYSIS_PROMPT,
+                mime_type,
+                route.model
+            ),
+            timeout=timeout
+        )
+        result["cached"] = False
+        if is_error_response(analysis):
+            # Never let a failure become the cached answer for this image
+            result["file_unique_id"] = result["content_hash"] = None
+
+    result["analysis"] = analysis
+    return result
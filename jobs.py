@@ -0,0 +1,176 @@
+from datetime import datetime
+from config import Config
+from database import Database
+from metrics import JOBS_FINISHED, JOB_WAIT
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """Durable queue of slow work (Gemini, search) in the jobs collection
+
+    Handlers enqueue and return; a single poller claims due jobs while
+    fewer than ``concurrency`` are running, runs each one's registered
+    function in its own task and deletes the job. Exceptions are
+    retried with exponential back-off until ``max_attempts``, after which
+    the job is marked failed and its failure callback tells the user.
+    Delivery is at-least-once: a job interrupted by a crash runs again
+    once its lease expires, and one interrupted by a clean shutdown is
+    handed back immediately.
+
+    Jobs of one chat run one at a time and in order: while a job waits
+    out its retry back-off, or a crashed worker's lease on it runs out,
+    later jobs of that chat wait too. In webhook mode a job is claimed by
+    the worker process that owns its chat, so this holds there as well.
+    """
+
+    def __init__(self, concurrency, max_attempts, retry_delay, lease, poll_interval):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.bot = None
+        self._handlers = {}
+        self._poller = None
+        self._tasks = set()
+        self._running = {}  # job _id -> chat_id
+        self._wakeup = asyncio.Event()
+
+    def register(self, kind, handler, on_failure=None, no_retry=()):
+        """``handler(bot, job)`` does the work; ``on_failure(bot, job, error)`` runs after the last attempt
+
+        Exceptions in ``no_retry`` fail the job at once, for errors a retry
+        cannot fix in time or that already left output in the chat.
+        """
+        self._handlers[kind] = (handler, on_failure, no_retry)
+
+    async def enqueue(self, kind, chat_id, payload):
+        now = datetime.utcnow()
+        job_id = await Database.enqueue_job({
+            "kind": kind,
+            "chat_id": chat_id,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "worker": Config.WORKER_INDEX,
+            "run_at": now,
+            "created_at": now
+        })
+        self._wakeup.set()
+        return job_id
+
+    async def start(self, bot):
+        """Start the workers; pending jobs left by a previous run are picked up first"""
+        if self._poller is not None:
+            return
+        await Database.ensure_job_ttl_index(Config.JOB_FAILED_TTL)
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._poller = asyncio.create_task(self._poll())
+        logger.info(f"Job queue started with {self.concurrency} workers")
+
+    async def close(self):
+        if self._poller is None:
+            return
+        # Cancelling a running job hands it back
+        tasks = [self._poller, *self._tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._poller = None
+
+    async def _claim_query(self):
+        # Worker 0 also adopts jobs of worker processes that no longer exist
+        workers = Config.WEBHOOK_WORKERS if Config.BOT_MODE == "webhook" else 1
+        if Config.WORKER_INDEX == 0:
+            shard = {"$or": [{"worker": 0}, {"worker": {"$gte": workers}}]}
+        else:
+            shard = {"worker": Config.WORKER_INDEX}
+
+        # A chat with an attempted job still unfinished (in back-off, or held
+        # by a crashed worker's lease) only lets that job through
+        held = await Database.held_job_chats(shard)
+        return {"$and": [
+            shard,
+            {"chat_id": {"$nin": list(self._running.values())}},
+            {"$or": [{"chat_id": {"$nin": held}}, {"attempts": {"$gt": 0}}]}
+        ]}
+
+    async def _claim(self):
+        try:
+            job = await Database.claim_job(await self._claim_query(), self.lease)
+        except Exception as e:
+            logger.error(f"Claim job error: {e}")
+            return None
+        if job is not None:
+            self._running[job["_id"]] = job["chat_id"]
+        return job
+
+    async def _poll(self):
+        # The only claimer, so two jobs of the same chat are never picked up
+        # together, and an idle process costs one claim per poll interval
+        while True:
+            await self._slots.acquire()
+            # Clear before claiming, so an enqueue during the claim is not missed
+            self._wakeup.clear()
+            job = await self._claim()
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _run(self, job):
+        kind = job["kind"]
+        handler, on_failure, no_retry = self._handlers[kind]
+        if job["attempts"] == 1:
+            JOB_WAIT.labels(kind).observe((job["claimed_at"] - job["created_at"]).total_seconds())
+
+        try:
+            await handler(self.bot, job)
+        except asyncio.CancelledError:
+            # Shutdown: hand the job back so the next start runs it straight away
+            await Database.release_jobs([job["_id"]])
+            raise
+        except Exception as e:
+            if job["attempts"] < self.max_attempts and not isinstance(e, no_retry):
+                delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                logger.warning(f"Job {job['_id']} ({kind}) failed, retrying in {delay:.0f}s: {e!r}")
+                await Database.retry_job(job["_id"], delay, repr(e))
+                return
+
+            logger.error(f"Job {job['_id']} ({kind}) failed after {job['attempts']} attempts: {e!r}")
+            JOBS_FINISHED.labels(kind, "failed").inc()
+            await Database.fail_job(job["_id"], repr(e))
+            if on_failure is not None:
+                try:
+                    await on_failure(self.bot, job, e)
+                except Exception as notify_error:
+                    logger.error(f"Job failure notification error: {notify_error}")
+        else:
+            JOBS_FINISHED.labels(kind, "done").inc()
+            await Database.complete_job(job["_id"])
+        finally:
+            self._running.pop(job["_id"], None)
+            # A finished chat may unblock its next job
+            self._wakeup.set()
+
+jobs = JobQueue(
+    Config.JOB_WORKERS,
+    Config.JOB_MAX_ATTEMPTS,
+    Config.JOB_RETRY_DELAY,
+    Config.JOB_LEASE,
+    Config.JOB_POLL_INTERVAL
+)
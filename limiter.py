@@ -1,29 +1,111 @@
-from telegram.ext import JobQueue
-from collections import defaultdict
-from datetime import datetime, timedelta
+from collections import OrderedDict
 from config import Config
+from database import Database
+from metrics import RATE_LIMITED
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def _estimate(prev_count, curr_count, window_start, now, window):
+    """Sliding-window-counter estimate of requests in the last `window` seconds"""
+    overlap = 1.0 - (now - window_start) / window
+    return prev_count * overlap + curr_count
+
+class MemoryBackend:
+    """Per-process counters: fixed-size state per user, idle users evicted"""
+
+    EVICT_PER_CALL = 2
+
+    def __init__(self, max_tracked):
+        self.max_tracked = max_tracked
+        self._state = OrderedDict()  # user_id -> [window_index, curr_count, prev_count]
+
+    async def allow(self, user_id, now, window, limit):
+        return self.allow_sync(user_id, now, window, limit)
+
+    def allow_sync(self, user_id, now, window, limit):
+        index = int(now // window)
+        state = self._state.get(user_id)
+        if state is None:
+            state = self._state[user_id] = [index, 0, 0]
+        else:
+            self._state.move_to_end(user_id)
+            if state[0] != index:
+                state[2] = state[1] if state[0] == index - 1 else 0
+                state[1] = 0
+                state[0] = index
+
+        allowed = _estimate(state[2], state[1], index * window, now, window) < limit
+        if allowed:
+            state[1] += 1
+        self._evict(index)
+        return allowed
+
+    def _evict(self, index):
+        # Least recently seen users sit at the front; drop a few that have
+        # gone quiet for two full windows, and anything beyond the cap.
+        for _ in range(self.EVICT_PER_CALL):
+            user_id, state = next(iter(self._state.items()))
+            if state[0] >= index - 1:
+                break
+            del self._state[user_id]
+        while len(self._state) > self.max_tracked:
+            self._state.popitem(last=False)
+
+    def __len__(self):
+        return len(self._state)
+
+class MongoBackend:
+    """Counters shared by every bot worker through the rate_limits collection"""
 
-class RateLimiter:
     def __init__(self):
-        self.user_requests = defaultdict(list)
-        
-    def check_limit(self, user_id):
-        now = datetime.now()
-        user_requests = [t for t in self.user_requests[user_id] if now - t < timedelta(minutes=1)]
-        self.user_requests[user_id] = user_requests
-        
-        if len(user_requests) >= Config.REQUEST_LIMIT:
-            return False
-        self.user_requests[user_id].append(now)
-        return True
-
-rate_limiter = RateLimiter()
+        self._index_ready = False
+
+    async def allow(self, user_id, now, window, limit):
+        if not self._index_ready:
+            self._index_ready = True
+            await Database.ensure_rate_limit_index()
+
+        index = int(now // window)
+        prev_count, curr_count = await Database.hit_rate_window(user_id, index, window)
+        # The hit was already counted; a rejected request gives it back
+        if _estimate(prev_count, curr_count - 1, index * window, now, window) < limit:
+            return True
+        await Database.release_rate_hit(user_id, index)
+        return False
+
+class RateLimiter:
+    def __init__(self, backend, limit, window=60):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+        self.rejections = 0
+
+    async def check_limit(self, user_id):
+        try:
+            allowed = await self.backend.allow(user_id, time.time(), self.window, self.limit)
+        except Exception as e:
+            # Fail open: a broken shared store must not lock everyone out
+            logger.error(f"Rate limiter backend error: {e}")
+            return True
+        if not allowed:
+            self.rejections += 1
+            RATE_LIMITED.inc()
+        return allowed
+
+def _make_backend():
+    if Config.RATE_LIMIT_BACKEND == "mongo":
+        return MongoBackend()
+    return MemoryBackend(Config.RATE_LIMIT_MAX_TRACKED)
+
+rate_limiter = RateLimiter(_make_backend(), Config.REQUEST_LIMIT, Config.RATE_LIMIT_WINDOW)
 
 def rate_limit(func):
     async def wrapper(update, context, *args, **kwargs):
         user_id = update.effective_user.id
-        if not rate_limiter.check_limit(user_id):
+        if not await rate_limiter.check_limit(user_id):
             await update.message.reply_text("⚠️ Rate limit exceeded. Please wait 1 minute.")
             return
         return await func(update, context, *args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
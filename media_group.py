@@ -0,0 +1,41 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MediaGroupCollector:
+    """Gathers the separate updates of a Telegram album into one batch
+
+    Each photo of an album arrives as its own update sharing a
+    ``media_group_id``. The batch is handed to ``handler(updates, context)``
+    once no new photo has arrived for ``window`` seconds.
+    """
+
+    def __init__(self, handler, window):
+        self.handler = handler
+        self.window = window
+        self._groups = {}  # media_group_id -> (updates, timer)
+        self._tasks = set()
+
+    def add(self, update, context):
+        group_id = update.message.media_group_id
+        loop = asyncio.get_running_loop()
+        updates, timer = self._groups.get(group_id, ([], None))
+        if timer is not None:
+            timer.cancel()
+        updates.append(update)
+        timer = loop.call_later(self.window, self._flush, group_id, context)
+        self._groups[group_id] = (updates, timer)
+
+    def _flush(self, group_id, context):
+        updates, _ = self._groups.pop(group_id)
+        updates.sort(key=lambda u: u.message.message_id)
+        task = asyncio.create_task(self._run(updates, context))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, updates, context):
+        try:
+            await self.handler(updates, context)
+        except Exception as e:
+            logger.error(f"Media group handler error: {e}")
@@ -0,0 +1,187 @@
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from telegram.request import HTTPXRequest
+import functools
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_seconds", "Time spent in each update handler", ["handler"], buckets=LATENCY_BUCKETS
+)
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Exceptions escaping a handler", ["handler"])
+IN_FLIGHT = Gauge("bot_updates_in_flight", "Updates currently inside a handler")
+
+UPSTREAM_LATENCY = Histogram(
+    "bot_upstream_seconds", "Latency of calls to external services",
+    ["upstream", "operation"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_ERRORS = Counter("bot_upstream_errors_total", "Failed calls to external services", ["upstream", "operation"])
+
+TIMEOUTS = Counter("bot_timeouts_total", "Operations abandoned after a timeout", ["operation"])
+RATE_LIMITED = Counter("bot_rate_limited_total", "Requests rejected by the per-user rate limiter")
+BUSY_REJECTIONS = Counter("bot_busy_rejections_total", "Requests rejected by the Gemini scheduler")
+JOBS_FINISHED = Counter("bot_jobs_total", "Background jobs by final outcome", ["kind", "outcome"])
+JOB_WAIT = Histogram(
+    "bot_job_wait_seconds", "Time from enqueue until a worker picks a job up", ["kind"], buckets=LATENCY_BUCKETS
+)
+FLOOD_WAITS = Counter("bot_flood_waits_total", "RetryAfter responses from the Bot API")
+OUTBOUND_WAIT = Histogram(
+    "bot_outbound_wait_seconds", "Time Bot API calls waited for a rate-limit slot", buckets=LATENCY_BUCKETS
+)
+
+CIRCUIT_OPEN = Gauge("bot_circuit_open", "1 while an upstream's circuit breaker is open", ["upstream"])
+HEDGED_CALLS = Counter("bot_hedged_calls_total", "Second requests started for slow upstream calls", ["upstream"])
+MODEL_ROUTES = Counter("bot_model_routes_total", "Gemini model chosen per request", ["kind", "model", "reason"])
+
+GEMINI_IN_FLIGHT = Gauge("bot_gemini_in_flight", "Gemini calls running on the executor")
+GEMINI_QUEUED = Gauge("bot_gemini_queued", "Gemini calls waiting for an executor slot")
+WRITE_PENDING = Gauge("bot_write_pending", "Documents waiting in the write-behind buffer")
+WRITE_FLUSHES = Gauge("bot_write_flushes", "Write-behind batches flushed since start")
+WRITE_MAX_FLUSH = Gauge("bot_write_max_flush_seconds", "Slowest write-behind flush since start, retries included")
+WRITE_FAILED = Gauge("bot_write_failed_docs", "Documents dropped after a write-behind batch ran out of retries")
+CACHE_HIT_RATE = Gauge("bot_cache_hit_ratio", "Hit ratio of the in-process caches", ["cache"])
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Duration of each startup phase", ["phase"])
+READY = Gauge("bot_ready", "1 once startup has finished and updates are served")
+
+class observe:
+    """Context manager timing one upstream call into UPSTREAM_LATENCY"""
+
+    def __init__(self, upstream, operation):
+        self.upstream = upstream
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_LATENCY.labels(self.upstream, self.operation).observe(time.perf_counter() - self.started)
+        if exc_type is not None:
+            UPSTREAM_ERRORS.labels(self.upstream, self.operation).inc()
+        return False
+
+def instrument(handler_name):
+    """Decorator recording latency, errors and in-flight count for a handler"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            IN_FLIGHT.inc()
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.labels(handler_name).inc()
+                raise
+            finally:
+                HANDLER_LATENCY.labels(handler_name).observe(time.perf_counter() - started)
+                IN_FLIGHT.dec()
+        return wrapper
+    return decorator
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every Mongo command the driver sends, whoever issued it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        UPSTREAM_LATENCY.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        UPSTREAM_LATENCY.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+        UPSTREAM_ERRORS.labels("mongo", event.command_name).inc()
+
+# .../bot<token>/<method>; file downloads live under .../file/bot<token>/<path>
+BOT_API_METHOD = re.compile(r"(?<!/file)/bot[^/]+/(\w+)$")
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times every outbound Bot API call by method name"""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        # File paths are unique per file, so they share one label
+        match = BOT_API_METHOD.search(url)
+        endpoint = match.group(1) if match else "file_download"
+        with observe("telegram", endpoint) as call:
+            code, payload = await super().do_request(url, method, request_data=request_data, **kwargs)
+            if code >= 400:
+                UPSTREAM_ERRORS.labels(call.upstream, call.operation).inc()
+            return code, payload
+
+def _samples(name):
+    for metric in REGISTRY.collect():
+        for sample in metric.samples:
+            if sample.name == name:
+                yield sample
+
+def _total(name):
+    return sum(sample.value for sample in _samples(name))
+
+def summarize():
+    """Plain-text digest of the key metrics for the /stats command"""
+    counts = {tuple(s.labels.values()): s.value for s in _samples("bot_handler_seconds_count")}
+    sums = {tuple(s.labels.values()): s.value for s in _samples("bot_handler_seconds_sum")}
+    lines = ["📊 Bot Stats", ""]
+    for key, count in sorted(counts.items()):
+        if count:
+            lines.append(f"{key[0]}: {count:.0f} calls, avg {sums[key] / count * 1000:.0f} ms")
+
+    upstream_counts = {tuple(s.labels.values()): s.value for s in _samples("bot_upstream_seconds_count")}
+    upstream_sums = {tuple(s.labels.values()): s.value for s in _samples("bot_upstream_seconds_sum")}
+    if upstream_counts:
+        lines.append("")
+        for key, count in sorted(upstream_counts.items()):
+            if count:
+                lines.append(f"{key[0]}.{key[1]}: {count:.0f} calls, avg {upstream_sums[key] / count * 1000:.0f} ms")
+
+    lines += [
+        "",
+        f"In flight: {_total('bot_updates_in_flight'):.0f} updates, "
+        f"{_total('bot_gemini_in_flight'):.0f} Gemini calls, {_total('bot_gemini_queued'):.0f} queued",
+        f"Write-behind pending: {_total('bot_write_pending'):.0f}",
+        f"Rate limited: {_total('bot_rate_limited_total'):.0f}, "
+        f"busy: {_total('bot_busy_rejections_total'):.0f}, "
+        f"timeouts: {_total('bot_timeouts_total'):.0f}, "
+        f"flood waits: {_total('bot_flood_waits_total'):.0f}",
+        f"Jobs done: {sum(s.value for s in _samples('bot_jobs_total') if s.labels['outcome'] == 'done'):.0f}, "
+        f"failed: {sum(s.value for s in _samples('bot_jobs_total') if s.labels['outcome'] == 'failed'):.0f}",
+    ]
+    routes = {}
+    for sample in _samples("bot_model_routes_total"):
+        model = sample.labels["model"]
+        routes[model] = routes.get(model, 0) + sample.value
+    if routes:
+        lines.append("Routes: " + ", ".join(f"{model} {count:.0f}" for model, count in sorted(routes.items())))
+    for sample in _samples("bot_cache_hit_ratio"):
+        lines.append(f"{sample.labels['cache']} cache hit rate: {sample.value:.0%}")
+    return "\n".join(lines)
+
+async def _metrics_endpoint(request):
+    return web.Response(body=generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+def _ready_endpoint(readiness):
+    async def ready(request):
+        is_ready, report = readiness()
+        return web.json_response(report, status=200 if is_ready else 503)
+    return ready
+
+async def start_metrics_server(host, port, readiness=None):
+    """Serve /metrics in Prometheus text format; returns the runner to clean up
+
+    ``readiness()`` returns (ready, report); when given, /ready serves the
+    report with 200 once ready and 503 before, for load balancer probes.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_endpoint)
+    if readiness is not None:
+        app.router.add_get("/ready", _ready_endpoint(readiness))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics available on {host}:{port}/metrics")
+    return runner
@@ -0,0 +1,100 @@
+from collections import namedtuple
+from config import Config
+from metrics import MODEL_ROUTES
+from resilience import gemini_upstream
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+Route = namedtuple("Route", ["model", "upstream", "reason"])
+
+# Wording that usually signals multi-step reasoning rather than chit-chat
+COMPLEX_HINTS = re.compile(
+    r"```|\b(explain|why|how does|prove|derive|compare|analy[sz]e|step by step|"
+    r"design|debug|implement|algorithm|calculate|translate)\b",
+    re.IGNORECASE
+)
+
+class ModelRouter:
+    """Pick a Gemini model per request from tiers ordered fastest first
+
+    Heuristics choose the preferred tier: extraction work (search summaries,
+    context folding) always starts on the fastest tier, long or
+    reasoning-style questions on the strongest. Vision prompts are the bot's
+    own, so images are routed by how many are analyzed together. A tier is then skipped while
+    its circuit is open, its recent error rate is too high or its p95
+    latency exceeds the request type's budget, trying faster tiers first.
+    """
+
+    FAMILIES = {"chat": "text", "search": "text", "summary": "text", "vision": "vision"}
+    LIGHT_KINDS = {"search", "summary"}
+
+    def __init__(self, tiers, budgets, complex_chars, complex_images, max_error_rate):
+        self.tiers = tiers
+        self.budgets = budgets
+        self.complex_chars = complex_chars
+        self.complex_images = complex_images
+        self.max_error_rate = max_error_rate
+
+    def preferred_tier(self, kind, text, images=0):
+        """Index of the tier the request deserves, and why"""
+        top = len(self.tiers[self.FAMILIES[kind]]) - 1
+        if kind in self.LIGHT_KINDS:
+            return 0, "light_task"
+        if kind == "vision":
+            return (top, "many_images") if images >= self.complex_images else (0, "few_images")
+        if len(text) >= self.complex_chars:
+            return top, "long_prompt"
+        if COMPLEX_HINTS.search(text):
+            return top, "complex"
+        return 0, "simple"
+
+    def _rejection(self, upstream, budget):
+        if not upstream.breaker.available:
+            return "circuit_open"
+        if upstream.error_rate() > self.max_error_rate:
+            return "error_rate"
+        if upstream.tracker.ready and upstream.tracker.percentile(95) > budget:
+            return "over_budget"
+        return None
+
+    def route(self, kind, text="", images=0):
+        """Route one request; ``text`` is what the user asked, not the full prompt"""
+        models = self.tiers[self.FAMILIES[kind]]
+        preferred, reason = self.preferred_tier(kind, text, images)
+        budget = self.budgets[kind]
+
+        # Degrade towards faster tiers before trying slower ones
+        order = list(range(preferred, -1, -1)) + list(range(preferred + 1, len(models)))
+        chosen = None
+        for index in order:
+            rejection = self._rejection(gemini_upstream(models[index]), budget)
+            if rejection is None:
+                chosen = index
+                break
+            if index == preferred:
+                reason = rejection
+
+        if chosen is None:
+            # Nothing within budget: any tier that still accepts calls beats none
+            available = [i for i in order if gemini_upstream(models[i]).breaker.available]
+            chosen, reason = (available[0], "best_effort") if available else (preferred, "no_healthy_tier")
+
+        model = models[chosen]
+        MODEL_ROUTES.labels(kind, model, reason).inc()
+        logger.debug(f"Routed {kind} request to {model} ({reason})")
+        return Route(model, gemini_upstream(model), reason)
+
+model_router = ModelRouter(
+    {"text": Config.GEMINI_TEXT_MODELS, "vision": Config.GEMINI_VISION_MODELS},
+    {
+        "chat": Config.ROUTE_BUDGET_CHAT,
+        "search": Config.ROUTE_BUDGET_SEARCH,
+        "vision": Config.ROUTE_BUDGET_VISION,
+        "summary": Config.ROUTE_BUDGET_SUMMARY,
+    },
+    Config.ROUTE_COMPLEX_CHARS,
+    Config.ROUTE_COMPLEX_IMAGES,
+    Config.ROUTE_MAX_ERROR_RATE
+)
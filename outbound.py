@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import Config
+from metrics import FLOOD_WAITS, OUTBOUND_WAIT
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """GCRA token bucket: callers reserve the next free slot, so sends keep their order"""
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self._tat = 0.0  # Theoretical arrival time of the next request
+        self._paused_until = 0.0
+
+    def reserve(self, now):
+        """Claim a slot; returns the seconds to wait before using it"""
+        start = max(now, self._tat - self.tolerance)
+        self._tat = max(self._tat, start) + self.interval
+        return start - now
+
+    def pause(self, now, seconds):
+        """Push every future slot past now + seconds, e.g. after a flood wait"""
+        self._tat = max(self._tat, now + seconds + self.tolerance)
+        self._paused_until = max(self._paused_until, now + seconds)
+
+    def paused_for(self, now):
+        """Seconds left of a pause, without claiming a slot"""
+        return max(0.0, self._paused_until - now)
+
+class OutboundLimiter(BaseRateLimiter):
+    """Paces Bot API calls under Telegram's global and per-chat limits
+
+    Every call takes a slot from the global bucket; calls addressed to a
+    chat first take a slot from that chat's bucket (groups get the slower
+    group rate). Chat actions are not messages and take no chat slot, but
+    still wait out the chat's flood wait. A RetryAfter pauses the chat's
+    bucket (the global one for calls without a chat) and the call is retried.
+    """
+
+    UNLIMITED_CHAT_ENDPOINTS = {"sendChatAction"}
+
+    def __init__(self, global_rate, global_burst, chat_rate, chat_burst, group_rate,
+                 max_retries=3, max_chats=10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = OrderedDict()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.pop(chat_id, None)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate) if is_group else TokenBucket(self.chat_rate, self.chat_burst)
+        self._chats[chat_id] = bucket
+        if len(self._chats) > self.max_chats:
+            # The least recently used chat has long since refilled its bucket
+            self._chats.popitem(last=False)
+        return bucket
+
+    async def _wait_turn(self, chat_id, paced):
+        started = time.monotonic()
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id)
+            delay = bucket.reserve(started) if paced else bucket.paused_for(started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        delay = self._global.reserve(time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        OUTBOUND_WAIT.observe(time.monotonic() - started)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = rate_limit_args if isinstance(rate_limit_args, int) else self.max_retries
+        chat_id = data.get("chat_id")
+        paced = endpoint not in self.UNLIMITED_CHAT_ENDPOINTS
+
+        for attempt in range(max_retries + 1):
+            await self._wait_turn(chat_id, paced)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                FLOOD_WAITS.inc()
+                if attempt == max_retries:
+                    raise
+                logger.warning(f"Flood wait of {e.retry_after}s on {endpoint} for chat {chat_id}")
+                bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+                bucket.pause(time.monotonic(), e.retry_after)
+
+def split_point(text, start, end):
+    """Where to cut text[start:] to fit before end; prefers a line break, then a space"""
+    for separator in ("\n", " "):
+        cut = text.rfind(separator, start, end)
+        # Unless it leaves the message mostly empty
+        if cut > start + (end - start) // 2:
+            return cut + 1
+    return end
+
+def split_message(text, limit=None):
+    """Split text into ordered chunks that each fit in one Telegram message"""
+    limit = limit or Config.TELEGRAM_MESSAGE_LIMIT
+    chunks = []
+    start = 0
+    while len(text) - start > limit:
+        cut = split_point(text, start, start + limit)
+        chunks.append(text[start:cut])
+        start = cut
+    chunks.append(text[start:])
+    return chunks
+
+async def send_in_chunks(bot, chat_id, text, reply_to=None, reply_markup=None, parse_mode=None):
+    """Send text as ordered messages; the first replies to reply_to, the keyboard rides on the last"""
+    chunks = split_message(text)
+    for index, chunk in enumerate(chunks):
+        options = {
+            "reply_to_message_id": reply_to if index == 0 else None,
+            "allow_sending_without_reply": True,
+            "reply_markup": reply_markup if index == len(chunks) - 1 else None
+        }
+        try:
+            sent = await bot.send_message(chat_id=chat_id, text=chunk, parse_mode=parse_mode, **options)
+        except BadRequest:
+            if parse_mode is None:
+                raise
+            # A split (or the model) can break Markdown entities
+            sent = await bot.send_message(chat_id=chat_id, text=chunk, **options)
+    return sent
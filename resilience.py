@@ -0,0 +1,220 @@
+from collections import deque
+from config import Config
+from metrics import CIRCUIT_OPEN, HEDGED_CALLS, TIMEOUTS
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is failing"""
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    @property
+    def ready(self):
+        return len(self._samples) >= self.min_samples
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, q):
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def available(self):
+        """False while calls would be rejected by check()"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def check(self):
+        """Raise CircuitOpenError while calls are rejected; True when this call is the half-open trial"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            raise CircuitOpenError(self.name)
+        if state == "half_open":
+            self._probing = True  # Let exactly one trial call through
+            return True
+        return False
+
+    def release(self):
+        """End a trial call that gave no verdict (cancelled or rejected locally), so another call can probe"""
+        self._probing = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                logger.error(f"Circuit {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._probing = False
+            CIRCUIT_OPEN.labels(self.name).set(1)
+
+class ResilientUpstream:
+    """Adaptive timeout, optional hedging and a circuit breaker around one upstream
+
+    The timeout is ``p99 * timeout_multiplier`` of recent successes, clamped
+    to ``[timeout_floor, timeout_ceiling]``; until enough samples exist the
+    ceiling is used. A hedge is a second identical call started once the
+    first has run longer than the recent p95; whichever finishes first wins.
+    """
+
+    def __init__(self, name, timeout_floor, timeout_ceiling, timeout_multiplier=2.0,
+                 hedge=False, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout_floor = timeout_floor
+        self.timeout_ceiling = timeout_ceiling
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge = hedge
+        self.tracker = LatencyTracker()
+        self.first_chunk = LatencyTracker()  # Streams: dispatch to first chunk
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._outcomes = deque(maxlen=100)  # True for failed calls
+
+    def error_rate(self):
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def timeout(self, tracker=None):
+        """Adaptive timeout from ``tracker``, the whole-call window by default"""
+        tracker = tracker or self.tracker
+        if not tracker.ready:
+            return self.timeout_ceiling
+        adaptive = tracker.percentile(99) * self.timeout_multiplier
+        return min(self.timeout_ceiling, max(self.timeout_floor, adaptive))
+
+    async def call(self, make_call, is_failure=None, ignore=(), wait_turn=None):
+        """Await make_call() under the upstream's policies
+
+        ``is_failure(result)`` flags results that should count against the
+        breaker without raising; exceptions in ``ignore`` (e.g. local
+        back-pressure) pass through without counting. ``wait_turn()``, when
+        given, is awaited first for a local slot: that wait has its own
+        deadline and never counts against the upstream, so the timeout and
+        the latency sample cover only the call itself.
+        """
+        probe = self.breaker.check()
+        verdict = False
+        try:
+            if wait_turn is not None:
+                try:
+                    await asyncio.wait_for(wait_turn(), self.timeout())
+                except asyncio.TimeoutError:
+                    TIMEOUTS.labels(f"{self.name}:queued").inc()
+                    raise
+
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(self._attempt(make_call), self.timeout())
+            except asyncio.TimeoutError:
+                TIMEOUTS.labels(self.name).inc()
+                verdict = True
+                self.record_failure()
+                raise
+            except ignore:
+                raise
+            except Exception:
+                verdict = True
+                self.record_failure()
+                raise
+
+            verdict = True
+            if is_failure is not None and is_failure(result):
+                self.record_failure()
+            else:
+                self.record_success(time.monotonic() - started)
+            return result
+        finally:
+            if probe and not verdict:
+                # Otherwise the breaker would wait forever for this probe's outcome
+                self.breaker.release()
+
+    def record_success(self, seconds=None):
+        """Count a success; ``seconds`` feeds the latency window when comparable"""
+        if seconds is not None:
+            self.tracker.record(seconds)
+        self._outcomes.append(False)
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self._outcomes.append(True)
+        self.breaker.record_failure()
+
+    async def _attempt(self, make_call):
+        first = asyncio.ensure_future(make_call())
+        if not self.hedge or not self.tracker.ready:
+            return await first
+
+        attempts = {first}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.tracker.percentile(95))
+            if not done:
+                HEDGED_CALLS.labels(self.name).inc()
+                attempts.add(asyncio.ensure_future(make_call()))
+
+            while True:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None or not attempts:
+                        return attempt.result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+_gemini_upstreams = {}
+
+def gemini_upstream(model_name):
+    """Per-model upstream, so one slow or failing tier does not trip the others"""
+    upstream = _gemini_upstreams.get(model_name)
+    if upstream is None:
+        upstream = _gemini_upstreams[model_name] = ResilientUpstream(
+            f"gemini:{model_name}",
+            Config.GEMINI_TIMEOUT_FLOOR,
+            Config.GEMINI_TIMEOUT_CEILING,
+            hedge=Config.GEMINI_HEDGE,
+            failure_threshold=Config.BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=Config.BREAKER_RESET_TIMEOUT
+        )
+    return upstream
+
+serper_upstream = ResilientUpstream(
+    "serper",
+    Config.SERPER_TIMEOUT_FLOOR,
+    Config.SERPER_TIMEOUT_CEILING,
+    hedge=Config.SERPER_HEDGE,
+    failure_threshold=Config.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=Config.BREAKER_RESET_TIMEOUT
+)
@@ -0,0 +1,110 @@
+from cache import TTLCache
+from config import Config
+from database import Database
+from gemini_helper import is_error_response
+from metrics import CACHE_HIT_RATE
+import asyncio
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt):
+    """Fold case, spacing and trailing punctuation so near-duplicates share a key"""
+    return _WHITESPACE.sub(" ", prompt).strip().rstrip("?!. ").casefold()
+
+def cache_key(prompt, model):
+    return hashlib.sha256(f"{model}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Two-tier Gemini response cache with single-flight request coalescing
+
+    The memory tier is bounded by entry count and total response size; the
+    optional Mongo tier is shared between workers and expires via a TTL index.
+    """
+
+    def __init__(self, ttl, max_entries, max_bytes, use_mongo=False):
+        self.ttl = ttl
+        self.use_mongo = use_mongo
+        self.memory = TTLCache(
+            max_entries,
+            ttl,
+            maxbytes=max_bytes,
+            sizeof=lambda text: len(text.encode("utf-8"))
+        )
+        self.coalesced = 0
+        self._inflight = {}
+        self._index_ready = False
+
+    async def get(self, prompt, model):
+        key = cache_key(prompt, model)
+        response = self.memory.get(key)
+        if response is None and self.use_mongo:
+            await self._ensure_index()
+            response = await Database.get_cached_response(key, self.ttl)
+            if response is not None:
+                self.memory.set(key, response)
+        return response
+
+    async def put(self, prompt, model, response):
+        if is_error_response(response):
+            return
+        key = cache_key(prompt, model)
+        self.memory.set(key, response)
+        if self.use_mongo:
+            await self._ensure_index()
+            await Database.save_cached_response(key, model, response)
+
+    async def get_or_generate(self, prompt, model, producer):
+        """Return a cached answer, join an identical in-flight call, or run producer()
+
+        Callers are shielded from each other: one caller timing out does not
+        cancel the upstream call the others are waiting on.
+        """
+        key = cache_key(prompt, model)
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        response = await self.get(prompt, model)
+        if response is not None:
+            return response
+
+        # Another caller may have started the same flight during the lookup
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._fill(key, prompt, model, producer))
+            # Mark the outcome as retrieved even if every caller gave up
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[key] = flight
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(flight)
+
+    async def _fill(self, key, prompt, model, producer):
+        try:
+            response = await producer()
+            await self.put(prompt, model, response)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _ensure_index(self):
+        if not self._index_ready:
+            self._index_ready = True
+            await Database.ensure_response_cache_index(self.ttl)
+
+    def stats(self):
+        return {**self.memory.stats(), "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+response_cache = ResponseCache(
+    Config.RESPONSE_CACHE_TTL,
+    Config.RESPONSE_CACHE_MAX_ENTRIES,
+    Config.RESPONSE_CACHE_MAX_BYTES,
+    use_mongo=Config.RESPONSE_CACHE_MONGO
+)
+CACHE_HIT_RATE.labels("response").set_function(lambda: response_cache.memory.stats()["hit_rate"])
@@ -0,0 +1,130 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import Config
+from metrics import BUSY_REJECTIONS, GEMINI_IN_FLIGHT, GEMINI_QUEUED
+from gemini_helper import is_error_response
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SchedulerBusy(Exception):
+    """Raised when a request is rejected instead of queued"""
+
+class GeminiScheduler:
+    """Caps in-flight Gemini calls and serves queued work round-robin per user"""
+
+    def __init__(self, max_in_flight, max_queued, max_queued_per_user):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight,
+            thread_name_prefix="gemini"
+        )
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._in_flight = 0
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def queued(self):
+        return self._queued
+
+    def enqueue(self, user_id, fn, *args):
+        """Queue fn(*args) for the Gemini pool; returns (started, result) futures
+
+        ``started`` resolves when the pool picks the call up. Cancelling
+        ``result`` before that drops the call from the queue.
+        """
+        user_queue = self._queues.get(user_id)
+        if self._queued >= self.max_queued or (
+            user_queue is not None and len(user_queue) >= self.max_queued_per_user
+        ):
+            BUSY_REJECTIONS.inc()
+            logger.warning(f"Gemini scheduler busy, rejecting request from {user_id}")
+            raise SchedulerBusy()
+
+        loop = asyncio.get_running_loop()
+        started, result = loop.create_future(), loop.create_future()
+        self._queues.setdefault(user_id, deque()).append((started, result, fn, args))
+        self._queued += 1
+        self._dispatch()
+        return started, result
+
+    async def submit(self, user_id, fn, *args):
+        """Run fn(*args) on the Gemini pool once a slot is free for this user"""
+        _, result = self.enqueue(user_id, fn, *args)
+        return await result
+
+    async def call(self, upstream, user_id, fn, *args):
+        """Run fn(*args) on the pool under the upstream's timeout, hedging and circuit breaker
+
+        The timeout and latency clock start when the pool picks the call
+        up: time spent queued behind local work says nothing about Gemini,
+        and must not trip its breaker or skew its latency window.
+        """
+        queued = {}
+
+        async def wait_turn():
+            queued["started"], queued["result"] = self.enqueue(user_id, fn, *args)
+            try:
+                await queued["started"]
+            except asyncio.CancelledError:
+                queued["result"].cancel()
+                raise
+
+        def make_call():
+            # The first attempt is the call already running; a hedge queues another
+            if "result" in queued:
+                return queued.pop("result")
+            return self.submit(user_id, fn, *args)
+
+        return await upstream.call(
+            make_call,
+            is_failure=lambda result: isinstance(result, str) and is_error_response(result),
+            ignore=(SchedulerBusy,),
+            wait_turn=wait_turn
+        )
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._in_flight < self.max_in_flight and self._queues:
+            user_id, user_queue = next(iter(self._queues.items()))
+            started, future, fn, args = user_queue.popleft()
+            self._queued -= 1
+            if user_queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            # Callers that timed out while queued never reach the pool
+            if future.cancelled():
+                continue
+
+            self._in_flight += 1
+            if not started.done():
+                started.set_result(None)
+            task = loop.run_in_executor(self._executor, fn, *args)
+            task.add_done_callback(partial(self._finished, future))
+
+    def _finished(self, future, task):
+        self._in_flight -= 1
+        if not future.done():
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        self._dispatch()
+
+gemini_scheduler = GeminiScheduler(
+    Config.GEMINI_MAX_IN_FLIGHT,
+    Config.GEMINI_MAX_QUEUED,
+    Config.GEMINI_MAX_QUEUED_PER_USER
+)
+GEMINI_IN_FLIGHT.set_function(lambda: gemini_scheduler.in_flight)
+GEMINI_QUEUED.set_function(lambda: gemini_scheduler.queued)
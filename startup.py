@@ -0,0 +1,68 @@
+from config import Config, ConfigError
+from database import Database
+from gemini_helper import get_gemini
+from metrics import READY, STARTUP_SECONDS
+from pymongo.errors import ConfigurationError, ConnectionFailure, OperationFailure
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Readiness:
+    """Startup progress of this process: how long each phase took and whether it serves yet"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {}
+        self.ready = False
+
+    def record(self, phase, seconds):
+        self.phases[phase] = round(seconds, 3)
+        STARTUP_SECONDS.labels(phase).set(seconds)
+
+    def mark_ready(self):
+        self.record("total", time.monotonic() - self.started)
+        self.ready = True
+        READY.set(1)
+        logger.info("Ready: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items()))
+
+    def report(self):
+        return self.ready, {"ready": self.ready, "phases": dict(self.phases)}
+
+readiness = Readiness()
+
+async def _timed(phase, awaitable):
+    started = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        readiness.record(phase, time.monotonic() - started)
+
+async def _warm_mongo():
+    try:
+        await _timed("mongo", Database.ping())
+    except (ConfigurationError, ConnectionFailure, OperationFailure) as e:
+        # Malformed URI, unresolvable SRV record, no server answering or rejected credentials
+        raise ConfigError(f"MongoDB: {e}") from e
+    await _timed("indexes", Database.ensure_indexes())
+
+async def _warm_gemini():
+    models = list(dict.fromkeys(Config.GEMINI_TEXT_MODELS + Config.GEMINI_VISION_MODELS))
+    await _timed("gemini", asyncio.to_thread(lambda: get_gemini().warm(models, Config.STARTUP_CHECK_GEMINI)))
+
+async def prewarm():
+    """Connect to Mongo and create indexes while the Gemini SDK loads
+
+    Both clients are otherwise created by the first request that needs
+    them. Raises ConfigError when a setting is rejected, or when warming
+    takes longer than STARTUP_TIMEOUT (usually an unreachable server).
+    The Serper session stays lazy: it is cheap to create and Serper has
+    no free call to check the key with.
+    """
+    try:
+        await asyncio.wait_for(asyncio.gather(_warm_mongo(), _warm_gemini()), Config.STARTUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ConfigError(
+            f"Startup pre-warm took longer than {Config.STARTUP_TIMEOUT:.0f}s, is MongoDB reachable?"
+        ) from None
@@ -0,0 +1,151 @@
+from telegram.error import BadRequest
+from config import Config
+from gemini_helper import get_gemini
+from scheduler import gemini_scheduler
+from outbound import split_point
+from metrics import TIMEOUTS
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = "🤖 Thinking..."
+CURSOR = " ▌"
+_DONE = object()
+
+class StreamInterrupted(Exception):
+    """A stream failed after part of the answer was already posted; the cause is chained"""
+
+class StreamedReply:
+    """A reply that grows through throttled edits and spills into new messages"""
+
+    def __init__(self, bot, chat_id, message, header):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message = message
+        self.prefix = header
+        self.offset = 0
+        self.shown = None
+
+    async def render(self, text, final=False):
+        limit = Config.TELEGRAM_MESSAGE_LIMIT - len(CURSOR)
+        while len(self.prefix) + len(text) - self.offset > limit:
+            cut = self._split_point(text, limit)
+            await self._edit(self.prefix + text[self.offset:cut], final=True)
+            self.offset = cut
+            self.prefix = ""
+            self.message = await self.bot.send_message(chat_id=self.chat_id, text=PLACEHOLDER)
+            self.shown = PLACEHOLDER
+
+        body = self.prefix + text[self.offset:]
+        await self._edit(body if final else body + CURSOR, final=final)
+
+    def _split_point(self, text, limit):
+        return split_point(text, self.offset, self.offset + limit - len(self.prefix))
+
+    async def _edit(self, text, final=False):
+        if not text.strip() or text == self.shown:
+            return
+        try:
+            if final:
+                try:
+                    await self.message.edit_text(text, parse_mode="Markdown")
+                except BadRequest:
+                    # Model output is not always valid Markdown
+                    await self.message.edit_text(text)
+            else:
+                await self.message.edit_text(text)
+            self.shown = text
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+
+async def stream_answer(bot, chat_id, prompt, timeout, route, reply_to=None, header="🤖 **Response**\n\n",
+                        reply_markup=None):
+    """Stream a Gemini answer from the routed model into the chat and return the full text
+
+    The first chunk gets the upstream's adaptive timeout, learnt from recent
+    times to first chunk; each later chunk may take up to ``timeout``.
+    """
+    upstream = route.upstream
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    stop = threading.Event()
+
+    def pump():
+        for chunk in get_gemini().stream_text(prompt, route.model):
+            if stop.is_set():
+                break
+            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+    probe = upstream.breaker.check()  # Fail fast before queueing or posting a placeholder
+    verdict = False
+    producer = placeholder = reply = None
+    text = ""
+
+    try:
+        started, producer = gemini_scheduler.enqueue(chat_id, pump)
+        producer.add_done_callback(lambda _: chunks.put_nowait(_DONE))
+
+        # A reply keyboard can only be attached when sending, not when editing
+        placeholder = await bot.send_message(
+            chat_id=chat_id,
+            text=PLACEHOLDER,
+            reply_to_message_id=reply_to,
+            allow_sending_without_reply=True,
+            reply_markup=reply_markup
+        )
+        reply = StreamedReply(bot, chat_id, placeholder, header)
+        # Waiting for a pool slot is local back-pressure, not Gemini being slow
+        await asyncio.wait_for(asyncio.shield(started), timeout=timeout)
+        dispatched = last_edit = loop.time()
+
+        try:
+            try:
+                chunk = await asyncio.wait_for(chunks.get(), timeout=upstream.timeout(upstream.first_chunk))
+            except asyncio.TimeoutError:
+                TIMEOUTS.labels(upstream.name).inc()
+                raise
+            if chunk is not _DONE:
+                # The whole stream is not comparable with a timeout window; its start is
+                upstream.first_chunk.record(loop.time() - dispatched)
+            while chunk is not _DONE:
+                text += chunk
+                if loop.time() - last_edit >= Config.STREAM_EDIT_INTERVAL:
+                    await reply.render(text)
+                    last_edit = loop.time()
+                chunk = await asyncio.wait_for(chunks.get(), timeout=timeout)
+
+            if producer.exception() is not None:
+                raise producer.exception()
+        except Exception:
+            verdict = True
+            upstream.record_failure()
+            raise
+        verdict = True
+        upstream.record_success()
+    except BaseException as e:
+        stop.set()
+        if producer is not None:
+            producer.cancel()
+        try:
+            if text:
+                await reply.render(text, final=True)
+            elif placeholder is not None:
+                await placeholder.delete()
+        except Exception as cleanup_error:
+            logger.error(f"Stream cleanup error: {cleanup_error}")
+        if text and isinstance(e, Exception):
+            # Starting over would post a second answer under the partial one
+            raise StreamInterrupted() from e
+        raise
+    finally:
+        if probe and not verdict:
+            # Cancelled, busy or never started: let the next call probe instead
+            upstream.breaker.release()
+
+    if not text:
+        text = "⚠️ Empty response from the model. Please try rephrasing."
+    await reply.render(text, final=True)
+    return text
@@ -1,70 +1,243 @@
-import requests
 from config import Config
-from gemini_helper import GeminiHelper
+from cache import TTLCache
+from gemini_helper import get_gemini
+from response_cache import response_cache
+from scheduler import gemini_scheduler, SchedulerBusy
+from metrics import observe, TIMEOUTS, UPSTREAM_ERRORS, CACHE_HIT_RATE
+from resilience import CircuitOpenError, serper_upstream
+from model_router import model_router
+from context_engine import estimate_tokens
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import aiohttp
+import asyncio
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
+SNIPPET_CHARS = 300
+
+def _clip(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+def direct_answer(results):
+    """Answer text from Serper's answer box or knowledge graph, if it has one"""
+    box = results.get('answerBox') or {}
+    answer = box.get('answer') or box.get('snippet')
+    if answer:
+        return f"{box['title']}: {answer}" if box.get('title') else answer
+
+    graph = results.get('knowledgeGraph') or {}
+    if graph.get('description'):
+        heading = graph.get('title', '')
+        if graph.get('type'):
+            heading += f" ({graph['type']})"
+        lines = [heading, graph['description']] if heading else [graph['description']]
+        lines += [f"{name}: {value}" for name, value in list((graph.get('attributes') or {}).items())[:5]]
+        return "\n".join(lines)
+    return None
+
+def direct_answer_link(results):
+    box = results.get('answerBox') or {}
+    graph = results.get('knowledgeGraph') or {}
+    return box.get('link') or graph.get('descriptionLink') or graph.get('website')
+
+def build_digest(results, token_budget):
+    """Numbered title/snippet/source lines, whole results only, within token_budget
+
+    The top web results come first, then the freshest news, then the rest,
+    so a tight budget still keeps a mix of both.
+    """
+    organic = results.get('organic') or []
+    seen = {item.get('link') for item in organic}
+    news = [item for item in results.get('news') or [] if item.get('link') not in seen]
+    ordered = organic[:3] + news[:2] + organic[3:] + news[2:]
+
+    lines = []
+    used = 0
+    for item in ordered:
+        source = urlparse(item.get('link', '')).netloc.removeprefix("www.")
+        if item in news:
+            source = f"news, {source}, {item['date']}" if item.get('date') else f"news, {source}"
+        entry = (
+            f"{len(lines) + 1}. {item.get('title', '').strip()} [{source}]\n"
+            f"{_clip(item.get('snippet', '').strip(), SNIPPET_CHARS)}"
+        )
+        cost = estimate_tokens(entry)
+        if lines and used + cost > token_budget:
+            break
+        lines.append(entry)
+        used += cost
+    return "\n".join(lines)
+
+def top_links(results, count=3):
+    items = (results.get('organic') or []) or (results.get('news') or [])
+    return [item.get('link') for item in items[:count] if item.get('link')]
+
 class WebSearch:
     MAX_RETRIES = 3
     RETRY_DELAY = 1.5
+    SUMMARY_TIMEOUT = 25
+
+    _session = None
+    _cache = TTLCache(Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL)
 
     @staticmethod
-    def search(query):
-        for attempt in range(WebSearch.MAX_RETRIES):
-            try:
-                headers = {
+    def _get_session():
+        """Persistent pooled session, created on first use inside the event loop"""
+        if WebSearch._session is None or WebSearch._session.closed:
+            WebSearch._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=Config.SERPER_POOL_SIZE,
+                    ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=10),
+                headers={
                     'X-API-KEY': Config.SERPER_API_KEY,
                     'Content-Type': 'application/json'
                 }
-                params = {
-                    'q': query,
-                    'gl': 'in',
-                    'hl': 'en',
-                    'num': 5
-                }
+            )
+        return WebSearch._session
+
+    @staticmethod
+    async def close():
+        if WebSearch._session is not None and not WebSearch._session.closed:
+            await WebSearch._session.close()
+        WebSearch._session = None
+
+    @staticmethod
+    async def search(query, gl='in', hl='en', user_id=None):
+        params = {
+            'q': query,
+            'gl': gl,
+            'hl': hl,
+            'num': 5
+        }
 
-                response = requests.post(
-                    'https://google.serper.dev/search',
-                    headers=headers,
-                    json=params,
-                    timeout=10
+        # Web and news results are fetched concurrently; news is best effort
+        fetches = [WebSearch._fetch("search", Config.SERPER_URL, params)]
+        if Config.SEARCH_NEWS:
+            fetches.append(WebSearch._fetch("news", Config.SERPER_NEWS_URL, params))
+        (results, error), *news = await asyncio.gather(*fetches)
+
+        if results is None:
+            return {"summary": error, "links": []}
+        if news and news[0][0] is not None:
+            results = {**results, "news": news[0][0].get('news', [])}
+        return await WebSearch._process_results(query, results, user_id)
+
+    @staticmethod
+    async def _fetch(operation, url, params):
+        """Cached, retried Serper call; returns (results, None) or (None, error message)"""
+        key = (operation, params['q'].strip().casefold(), params['gl'], params['hl'])
+        results = WebSearch._cache.get(key)
+        if results is not None:
+            return results, None
+
+        for attempt in range(WebSearch.MAX_RETRIES):
+            try:
+                # Adaptive timeout and hedging; 5xx answers count against the breaker
+                status, payload, retry_after = await serper_upstream.call(
+                    lambda: WebSearch._post(operation, url, params),
+                    is_failure=lambda result: result[0] >= 500
                 )
 
-                if response.status_code == 200:
-                    results = response.json()
-                    return WebSearch._process_results(query, results)
-                
-                logger.error(f"Search API Error: {response.status_code} - {response.text}")
-                if response.status_code == 429:
-                    time.sleep(WebSearch.RETRY_DELAY ** (attempt + 1))
-                    continue
-                    
-                return {"summary": WebSearch._error_message(response.status_code), "links": []}
-
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Network Error: {str(e)}")
+                if status == 200:
+                    WebSearch._cache.set(key, payload)
+                    return payload, None
+
+                logger.error(f"Search API Error ({operation}): {status} - {payload}")
+                if status == 429 and attempt < WebSearch.MAX_RETRIES - 1:
+                    delay = WebSearch._retry_delay(retry_after, attempt)
+                    if delay <= Config.SERPER_MAX_RETRY_AFTER:
+                        await asyncio.sleep(delay)
+                        continue
+
+                return None, WebSearch._error_message(status)
+
+            except CircuitOpenError:
+                # Serve an expired result rather than nothing while Serper is down
+                stale = WebSearch._cache.get_stale(key)
+                if stale is not None:
+                    return stale, None
+                return None, "🛠 Search is temporarily unavailable. Try later."
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Network Error ({operation}): {str(e)}")
                 if attempt == WebSearch.MAX_RETRIES - 1:
-                    return {"summary": "⚠️ Network issue. Check connection.", "links": []}
-                time.sleep(WebSearch.RETRY_DELAY)
+                    return None, "⚠️ Network issue. Check connection."
+                await asyncio.sleep(WebSearch.RETRY_DELAY)
+
+        return None, "⚠️ Service unavailable. Try later."
 
-        return {"summary": "⚠️ Service unavailable. Try later.", "links": []}
+    @staticmethod
+    async def _post(operation, url, params):
+        """One Serper request; returns (status, json or body text, Retry-After)"""
+        with observe("serper", operation):
+            async with WebSearch._get_session().post(url, json=params) as response:
+                if response.status == 200:
+                    return response.status, await response.json(), None
+                UPSTREAM_ERRORS.labels("serper", operation).inc()
+                return response.status, await response.text(), response.headers.get('Retry-After')
 
     @staticmethod
-    def _process_results(query, results):
-        if not results.get('organic'):
+    def _retry_delay(retry_after, attempt):
+        """Honor Retry-After (seconds or HTTP date), else back off exponentially"""
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                when = parsedate_to_datetime(retry_after)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                logger.error(f"Unparseable Retry-After header: {retry_after}")
+        return WebSearch.RETRY_DELAY ** (attempt + 1)
+
+    @staticmethod
+    async def _process_results(query, results, user_id=None):
+        # Google already answered the question; no summary call needed
+        answer = direct_answer(results)
+        if answer:
+            links = top_links(results)
+            answer_link = direct_answer_link(results)
+            if answer_link and answer_link not in links:
+                links = [answer_link] + links[:2]
+            return {"summary": answer, "links": links}
+
+        if not results.get('organic') and not results.get('news'):
             return {"summary": f"No results found for '{query}'", "links": []}
 
         try:
-            truncated = str(results['organic'])[:2500]
-            summary = GeminiHelper().generate_text(
-                f"Summarize these search results about {query} in 3 bullet points: {truncated}"
+            digest = build_digest(results, Config.SEARCH_DIGEST_TOKENS)
+            prompt = f"Summarize these search results about {query} in 3 bullet points:\n\n{digest}"
+            gemini = get_gemini()
+            route = model_router.route("search", query)
+            summary = await asyncio.wait_for(
+                response_cache.get_or_generate(
+                    prompt,
+                    route.model,
+                    lambda: gemini_scheduler.call(route.upstream, user_id, gemini.generate_text, prompt, route.model)
+                ),
+                timeout=WebSearch.SUMMARY_TIMEOUT
             )
+            return {"summary": summary, "links": top_links(results)}
+        except SchedulerBusy:
+            return {"summary": "🚦 Summarizer is busy. Please try again in a moment.", "links": []}
+        except CircuitOpenError:
+            # Degraded answer: the links are still useful without a summary
             return {
-                "summary": summary,
-                "links": [l.get('link') for l in results['organic'][:3] if l.get('link')]
+                "summary": "🛠 Summaries are temporarily unavailable; here are the top links.",
+                "links": top_links(results)
             }
+        except asyncio.TimeoutError:
+            TIMEOUTS.labels("search_summary").inc()
+            logger.error("Search summary timeout")
+            return {"summary": "⌛ Summary timed out. Please try again.", "links": []}
         except Exception as e:
             logger.error(f"Result processing error: {str(e)}")
             return {"summary": "⚠️ Error analyzing results", "links": []}
@@ -77,4 +250,6 @@ class WebSearch:
             429: "Rate limit exceeded",
             500: "Server error"
         }
-        return f"⚠️ Search failed: {codes.get(status_code, 'Unknown error')}"
\ No newline at end of file
+        return f"⚠️ Search failed: {codes.get(status_code, 'Unknown error')}"
+
+CACHE_HIT_RATE.labels("search").set_function(lambda: WebSearch._cache.stats()["hit_rate"])
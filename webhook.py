@@ -0,0 +1,277 @@
+from aiohttp import web
+from telegram import Bot, Update
+from config import Config
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+
+logger = logging.getLogger(__name__)
+
+CHAT_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "my_chat_member", "chat_member", "chat_join_request"
+)
+USER_FIELDS = (
+    "inline_query", "chosen_inline_result", "shipping_query",
+    "pre_checkout_query", "poll_answer"
+)
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+IDLE_CHAT_SECONDS = 30
+
+def chat_key(data):
+    """Routing key for a raw update: its chat id, else the sender's id"""
+    for field in CHAT_FIELDS:
+        chat = (data.get(field) or {}).get("chat")
+        if chat:
+            return chat["id"]
+
+    callback = data.get("callback_query")
+    if callback:
+        message = callback.get("message") or {}
+        return message["chat"]["id"] if "chat" in message else callback["from"]["id"]
+
+    for field in USER_FIELDS:
+        payload = data.get(field) or {}
+        sender = payload.get("from") or payload.get("user")
+        if sender:
+            return sender["id"]
+    return data.get("update_id", 0)
+
+class ChatSequencer:
+    """Processes updates concurrently across chats but in order within a chat"""
+
+    def __init__(self, application, max_pending):
+        self.application = application
+        self.max_pending = max_pending
+        self.pending = 0
+        self._queues = {}
+        self._tasks = set()
+
+    def submit(self, data):
+        """Queue a raw update; False when the worker is saturated"""
+        if self.pending >= self.max_pending:
+            return False
+        key = chat_key(data)
+        chat_queue = self._queues.get(key)
+        if chat_queue is None:
+            chat_queue = self._queues[key] = asyncio.Queue()
+            task = asyncio.create_task(self._drain(key, chat_queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        chat_queue.put_nowait(data)
+        self.pending += 1
+        return True
+
+    async def _drain(self, key, chat_queue):
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(chat_queue.get(), IDLE_CHAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if chat_queue.empty():
+                        break
+                    continue
+
+                try:
+                    update = Update.de_json(data, self.application.bot)
+                    await self.application.process_update(update)
+                except Exception as e:
+                    logger.error(f"Update processing error (chat {key}): {e}")
+                finally:
+                    self.pending -= 1
+        finally:
+            del self._queues[key]
+
+    async def join(self):
+        """Wait until every queued update has been processed"""
+        while self.pending:
+            await asyncio.sleep(0.05)
+
+async def _start_application(application):
+    # Same lifecycle order as Application.run_polling, minus the updater
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+async def _stop_application(application):
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+class WorkerFailed(Exception):
+    """A webhook worker process failed to start or exited while serving"""
+
+def _worker_main(factory, inbox, status, index):
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    # The front process coordinates shutdown through the inbox sentinel; a
+    # service manager signals the whole process group, workers included
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_IGN)
+    asyncio.run(_run_worker(factory, inbox, status, index))
+
+async def _run_worker(factory, inbox, status, index):
+    application = factory()
+    try:
+        await _start_application(application)
+    except Exception as e:
+        status.put((index, f"{type(e).__name__}: {e}"))
+        raise
+    status.put((index, None))
+    sequencer = ChatSequencer(application, max_pending=float("inf"))
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, inbox.get)
+            if data is None:
+                break
+            sequencer.submit(data)
+        await sequencer.join()
+    finally:
+        await _stop_application(application)
+
+def _await_workers(status, processes):
+    """Block until every worker has started; raise WorkerFailed if one cannot"""
+    started = set()
+    while len(started) < len(processes):
+        try:
+            index, error = status.get(timeout=1)
+        except queue.Empty:
+            # A worker that dies before reporting (e.g. on import) never will
+            for index, process in enumerate(processes):
+                if index not in started and not process.is_alive():
+                    raise WorkerFailed(f"Webhook worker {index} exited with code {process.exitcode} during startup")
+            continue
+        if error is not None:
+            raise WorkerFailed(f"Webhook worker {index} failed to start: {error}")
+        started.add(index)
+
+async def _watch_workers(processes, stop):
+    """Stop serving once any worker process has exited; returns the failure, if any"""
+    while not stop.is_set():
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                stop.set()
+                return WorkerFailed(f"Webhook worker {index} exited with code {process.exitcode}")
+        await asyncio.sleep(1)
+    return None
+
+def _stop_workers(processes, inboxes):
+    for process, inbox in zip(processes, inboxes):
+        if process.is_alive():
+            inbox.put(None)
+    for process in processes:
+        process.join()
+
+async def _set_webhook(bot):
+    await bot.set_webhook(
+        url=f"{Config.WEBHOOK_URL.rstrip('/')}/{Config.WEBHOOK_PATH}",
+        secret_token=Config.WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+        max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+        drop_pending_updates=False
+    )
+
+def make_app(route):
+    """aiohttp app that hands each authenticated update to route(data)"""
+    async def receive(request):
+        if Config.WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != Config.WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        # Non-2xx makes Telegram redeliver the update later
+        return web.Response(status=200 if route(data) else 503)
+
+    app = web.Application()
+    app.router.add_post(f"/{Config.WEBHOOK_PATH}", receive)
+    return app
+
+async def _serve(factory, workers, register):
+    processes, inboxes, application, watcher = [], [], None, None
+    if workers <= 1:
+        application = factory()
+        await _start_application(application)
+        sequencer = ChatSequencer(application, Config.WEBHOOK_QUEUE_SIZE)
+        route = sequencer.submit
+    else:
+        context = multiprocessing.get_context("spawn")
+        status = context.Queue()
+        for index in range(workers):
+            inbox = context.Queue(maxsize=Config.WEBHOOK_QUEUE_SIZE)
+            process = context.Process(target=_worker_main, args=(factory, inbox, status, index), daemon=True)
+            # Spawned workers re-read Config; the index keeps their metrics ports apart
+            os.environ["WORKER_INDEX"] = str(index)
+            process.start()
+            inboxes.append(inbox)
+            processes.append(process)
+
+        # Accept updates only once every worker is up; one failing to start fails the whole server
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _await_workers, status, processes)
+        except WorkerFailed:
+            for process in processes:
+                process.kill()  # Workers ignore SIGTERM
+            _stop_workers(processes, inboxes)
+            raise
+
+        def route(data):
+            try:
+                inboxes[chat_key(data) % workers].put_nowait(data)
+                return True
+            except queue.Full:
+                return False
+
+    runner = web.AppRunner(make_app(route))
+    try:
+        await runner.setup()
+        await web.TCPSite(runner, Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT).start()
+        logger.info(f"Webhook listening on {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}/{Config.WEBHOOK_PATH}")
+
+        if register:
+            if application is not None:
+                await _set_webhook(application.bot)
+            else:
+                async with Bot(Config.TELEGRAM_TOKEN) as bot:
+                    await _set_webhook(bot)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        if processes:
+            # A dead worker's chats would otherwise get 200s, then 503s, forever
+            watcher = asyncio.create_task(_watch_workers(processes, stop))
+        await stop.wait()
+        logger.info("Webhook shutting down...")
+    finally:
+        try:
+            await runner.cleanup()
+            if application is not None:
+                await sequencer.join()
+                await _stop_application(application)
+        finally:
+            # Workers ignore SIGTERM, so multiprocessing's exit cleanup cannot stop them
+            _stop_workers(processes, inboxes)
+    failure = await watcher if watcher is not None else None
+    if failure is not None:
+        raise failure
+
+def serve(factory, workers=None, register=True):
+    """Serve updates over a webhook; workers > 1 shards chats across processes
+
+    ``factory`` must be a picklable, module-level callable returning a
+    configured Application. Each chat always lands on the same worker, so
+    its updates (and ConversationHandler state) stay in order.
+    """
+    asyncio.run(_serve(factory, workers or Config.WEBHOOK_WORKERS, register))
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class WriteBehindBuffer:
+    """Queues inserts and writes them in batches off the request path
+
+    A batch is flushed once it reaches ``batch_size`` documents or
+    ``flush_interval`` seconds after its first document, whichever comes
+    first. ``put`` blocks once ``max_pending`` documents are waiting.
+    A failed write is retried ``max_retries`` times with doubling delays
+    before its documents are dropped; while it retries, new documents
+    queue up behind it. The sink must tolerate a batch it partly wrote.
+    """
+
+    def __init__(self, sink, batch_size, flush_interval, max_pending, max_retries=5, retry_delay=0.5):
+        self.sink = sink  # async (collection_name, documents) -> None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = None
+        self._task = None
+        self.flushes = 0
+        self.flushed_docs = 0
+        self.failed_docs = 0
+        self.retries = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, collection, document):
+        if not self.running:
+            await self._flush([(collection, document)])
+            return
+        await self._queue.put((collection, document))
+
+    async def close(self):
+        """Flush everything still queued, then stop the background task"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        grouped = {}
+        for collection, document in batch:
+            grouped.setdefault(collection, []).append(document)
+
+        started = time.perf_counter()
+        for collection, documents in grouped.items():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self.sink(collection, documents)
+                    self.flushed_docs += len(documents)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        self.failed_docs += len(documents)
+                        logger.error(f"Write-behind flush error ({collection}), dropping {len(documents)} docs: {e}")
+                        break
+                    delay = self.retry_delay * 2 ** attempt
+                    self.retries += 1
+                    logger.warning(
+                        f"Write-behind flush error ({collection}, {len(documents)} docs), retrying in {delay:.1f}s: {e}"
+                    )
+                    await asyncio.sleep(delay)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "flushes": self.flushes,
+            "flushed_docs": self.flushed_docs,
+            "failed_docs": self.failed_docs,
+            "retries": self.retries,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0
+        }